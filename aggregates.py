@@ -0,0 +1,94 @@
+"""Summary tables behind the Dashboard's Quick Stats.
+
+request_totals (one row) and location_counts are kept up to date by triggers
+on weather_requests (see migration 5 in migrations.py), so reading the stats
+costs a handful of index lookups regardless of table size.
+
+Usage:
+    python aggregates.py check     # compare the summaries with a full recount
+    python aggregates.py rebuild   # recompute the summaries from weather_requests
+"""
+import argparse
+import math
+import sys
+
+import migrations
+
+
+def get_quick_stats(conn):
+    """Return (total requests, most requested location or None, average temperature or None)."""
+    total, temp_sum, temp_count = conn.execute(
+        "SELECT row_count, temp_sum, temp_count FROM request_totals WHERE id = 1"
+    ).fetchone()
+    top = conn.execute(
+        "SELECT location FROM location_counts ORDER BY request_count DESC LIMIT 1"
+    ).fetchone()
+    avg_temp = temp_sum / temp_count if temp_count else None
+    return total, top[0] if top else None, avg_temp
+
+
+def check(conn):
+    """Recount weather_requests and return a list of mismatches with the summary tables."""
+    problems = []
+    expected = conn.execute(
+        "SELECT COUNT(*), coalesce(SUM(temperature), 0), COUNT(temperature) FROM weather_requests"
+    ).fetchone()
+    actual = conn.execute(
+        "SELECT row_count, temp_sum, temp_count FROM request_totals WHERE id = 1"
+    ).fetchone()
+    if actual is None:
+        return ["request_totals is empty"]
+    for name, want, have in zip(("row_count", "temp_sum", "temp_count"), expected, actual):
+        # temp_sum accumulates float rounding error over many updates
+        if not math.isclose(want, have, rel_tol=1e-9, abs_tol=1e-6):
+            problems.append(f"request_totals.{name}: expected {want}, found {have}")
+
+    mismatched = conn.execute('''
+        SELECT expected.location, expected.n, location_counts.request_count
+        FROM (SELECT location, COUNT(*) AS n FROM weather_requests GROUP BY location) AS expected
+        LEFT JOIN location_counts ON location_counts.location = expected.location
+        WHERE location_counts.request_count IS NOT expected.n
+        UNION ALL
+        SELECT location, 0, request_count FROM location_counts
+        WHERE location NOT IN (SELECT location FROM weather_requests)
+    ''').fetchall()
+    for location, want, have in mismatched:
+        problems.append(f"location_counts[{location!r}]: expected {want}, found {have}")
+    return problems
+
+
+def rebuild(conn):
+    """Recompute request_totals and location_counts from weather_requests in one transaction."""
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO request_totals (id, row_count, temp_sum, temp_count)
+            SELECT 1, COUNT(*), coalesce(SUM(temperature), 0), COUNT(temperature) FROM weather_requests
+        ''')
+        conn.execute("DELETE FROM location_counts")
+        conn.execute('''
+            INSERT INTO location_counts (location, request_count)
+            SELECT location, COUNT(*) FROM weather_requests GROUP BY location
+        ''')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the Quick Stats summary tables.")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--db", default="weather_app.db", help="database path (default: weather_app.db)")
+    args = parser.parse_args()
+
+    conn = migrations.connect(args.db)
+    if args.command == "rebuild":
+        rebuild(conn)
+        print("Summary tables rebuilt.")
+        return
+
+    problems = check(conn)
+    for problem in problems:
+        print(problem)
+    print("Summary tables are consistent." if not problems else f"{len(problems)} inconsistencies found.")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Weather Analysis computations, pushed down into SQL and memoized.
+
+Each function aggregates inside SQLite and returns small plain-Python
+results. Results are memoized per database on the weather_requests version
+counter (table_versions, maintained by triggers), so Streamlit reruns reuse
+them until the data actually changes.
+"""
+import functools
+import threading
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def data_version(conn):
+    """Return (database file, weather_requests version) identifying the current data."""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    version = conn.execute("SELECT version FROM table_versions WHERE name = 'weather_requests'").fetchone()[0]
+    return path, version
+
+
+def memoize_on_version(func):
+    """Cache func(conn, *args) until the weather_requests version changes."""
+    @functools.wraps(func)
+    def wrapper(conn, *args):
+        path, version = data_version(conn)
+        key = (func.__name__, path, args)
+        with _memo_lock:
+            cached = _memo.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        result = func(conn, *args)
+        with _memo_lock:
+            _memo[key] = (version, result)
+        return result
+    return wrapper
+
+
+@memoize_on_version
+def temperature_summary(conn):
+    """Return {"count", "min", "max", "mean", "median"} over all temperatures (None when empty)."""
+    count, low, high, mean = conn.execute(
+        "SELECT COUNT(temperature), MIN(temperature), MAX(temperature), AVG(temperature) FROM weather_requests"
+    ).fetchone()
+    median = None
+    if count:
+        # Walk idx_requests_temperature to the middle one or two values
+        middle = conn.execute(
+            "SELECT temperature FROM weather_requests WHERE temperature IS NOT NULL "
+            "ORDER BY temperature LIMIT ? OFFSET ?",
+            (2 - count % 2, (count - 1) // 2)
+        ).fetchall()
+        median = sum(row[0] for row in middle) / len(middle)
+    return {"count": count, "min": low, "max": high, "mean": mean, "median": median}
+
+
+@memoize_on_version
+def temperature_histogram(conn, bins=20):
+    """Return [(bin start, bin end, count), ...] for bins equal-width temperature bins."""
+    summary = temperature_summary(conn)
+    low, high = summary["min"], summary["max"]
+    if not summary["count"]:
+        return []
+    width = (high - low) / bins or 1.0
+    counts = dict(conn.execute('''
+        SELECT MIN(CAST((temperature - ?) / ? AS INTEGER), ?) AS bin, COUNT(*)
+        FROM weather_requests WHERE temperature IS NOT NULL
+        GROUP BY bin
+    ''', (low, width, bins - 1)).fetchall())
+    return [(low + i * width, low + (i + 1) * width, counts.get(i, 0)) for i in range(bins)]
+
+
+@memoize_on_version
+def top_locations(conn, limit=10):
+    """Return [(location, request count), ...] for the most requested locations."""
+    return conn.execute(
+        "SELECT location, request_count FROM location_counts ORDER BY request_count DESC LIMIT ?", (limit,)
+    ).fetchall()
+
+
+@memoize_on_version
+def location_means(conn):
+    """Return [(location, mean temperature), ...], warmest first."""
+    return conn.execute('''
+        SELECT location, AVG(temperature) AS mean FROM weather_requests
+        WHERE temperature IS NOT NULL
+        GROUP BY location ORDER BY mean DESC
+    ''').fetchall()
+
+
+@memoize_on_version
+def monthly_means(conn):
+    """Return [(month abbreviation, mean temperature or None), ...] for Jan..Dec by start_date."""
+    means = dict(conn.execute('''
+        SELECT CAST(substr(start_date, 6, 2) AS INTEGER) AS month, AVG(temperature)
+        FROM weather_requests WHERE temperature IS NOT NULL AND start_date IS NOT NULL
+        GROUP BY month
+    ''').fetchall())
+    return [(name, means.get(i + 1)) for i, name in enumerate(MONTHS)]
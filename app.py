@@ -1,161 +1,47 @@
 import streamlit as st
-import sqlite3
-import requests
+from streamlit.errors import StreamlitAPIException
+import asyncio
 from datetime import datetime, timedelta
-import csv
-import sys
-import pandas as pd
-
-# API Keys (replace with your own)
-OPENWEATHER_API_KEY = ""
-GOOGLE_MAPS_API_KEY = ""
-YOUTUBE_API_KEY = ""
-
-# Database setup
-conn = sqlite3.connect("weather_app.db")
-cursor = conn.cursor()
-
-# Create table for weather data
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS weather_requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        location TEXT NOT NULL,
-        latitude REAL,
-        longitude REAL,
-        start_date TEXT,
-        end_date TEXT,
-        temperature REAL,
-        weather_desc TEXT,
-        request_time TEXT
-    )
-''')
-conn.commit()
-
-# Original functions (unchanged)
-def get_coordinates(location):
-    """Validate location and get coordinates using Google Maps Geocoding API."""
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location}&key={GOOGLE_MAPS_API_KEY}"
-    response = requests.get(url).json()
-    
-    if response["status"] == "OK":
-        lat = response["results"][0]["geometry"]["location"]["lat"]
-        lng = response["results"][0]["geometry"]["location"]["lng"]
-        return lat, lng
-    else:
-        raise ValueError("Invalid location or unable to geocode.")
+import analysis
+import metrics
+import observations
+from aggregates import get_quick_stats
+from cache import normalize_location
+from export import export_filename, export_mime, export_query
+from core import (
+    EXPORT_COLUMNS,
+    REQUEST_COLUMNS,
+    count_matching_requests,
+    count_weather_requests,
+    create_weather_request,
+    create_weather_requests,
+    db,
+    delete_weather_requests,
+    fetch_weather_requests_page,
+    get_api_stats,
+    get_coalescing_stats,
+    get_current_weather,
+    get_current_weather_many,
+    get_data_version,
+    get_quota_usage,
+    get_youtube_videos,
+    label_coordinates,
+    last_known_weather,
+    list_locations,
+    location_index,
+    read_request_forecast,
+    split_locations,
+    start_background_tasks,
+    suggest_locations,
+    update_weather_requests,
+)
 
-def get_current_weather(location):
-    """Fetch current weather for a given location."""
-    try:
-        lat, lng = get_coordinates(location)
-        url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lng}&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = requests.get(url).json()
-        
-        if response["cod"] == 200:
-            temp = response["main"]["temp"]
-            desc = response["weather"][0]["description"]
-            print(f"Current Weather in {location}: {temp}°C, {desc}")
-            return temp, desc, lat, lng
-        else:
-            print("Error fetching weather data.")
-            return None, None, None, None
-    except Exception as e:
-        print(f"Error: {e}")
-        return None, None, None, None
-
-def validate_date(date_str):
-    """Validate date format (YYYY-MM-DD)."""
-    try:
-        datetime.strptime(date_str, "%Y-%m-%d")
-        return True
-    except ValueError:
-        return False
-
-def create_weather_request(location, start_date, end_date):
-    """Store weather request in the database."""
-    if not validate_date(start_date) or not validate_date(end_date):
-        print("Invalid date format. Use YYYY-MM-DD.")
-        return False
-    
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
-    if start > end:
-        print("Start date must be before end date.")
-        return False
-    
-    temp, desc, lat, lng = get_current_weather(location)
-    if temp is not None:
-        cursor.execute('''
-            INSERT INTO weather_requests (location, latitude, longitude, start_date, end_date, temperature, weather_desc, request_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (location, lat, lng, start_date, end_date, temp, desc, datetime.now().isoformat()))
-        conn.commit()
-        print("Weather data saved successfully.")
-        return True
-    return False
-
-def read_weather_requests():
-    """Read all weather requests from the database."""
-    cursor.execute("SELECT * FROM weather_requests")
-    rows = cursor.fetchall()
-    return rows
-
-def update_weather_request(record_id, new_temp=None, new_desc=None):
-    """Update a weather request."""
-    cursor.execute("SELECT * FROM weather_requests WHERE id = ?", (record_id,))
-    if not cursor.fetchone():
-        print("Record not found.")
-        return False
-    
-    if new_temp is not None and not isinstance(new_temp, (int, float)):
-        print("Temperature must be a number.")
-        return False
-    
-    if new_temp is not None:
-        cursor.execute("UPDATE weather_requests SET temperature = ? WHERE id = ?", (new_temp, record_id))
-    if new_desc is not None:
-        cursor.execute("UPDATE weather_requests SET weather_desc = ? WHERE id = ?", (new_desc, record_id))
-    
-    conn.commit()
-    print("Record updated successfully.")
-    return True
-
-def delete_weather_request(record_id):
-    """Delete a weather request."""
-    cursor.execute("SELECT * FROM weather_requests WHERE id = ?", (int(record_id),))
-    if not cursor.fetchone():
-        print("Record not found.")
-        return False
-    
-    cursor.execute("DELETE FROM weather_requests WHERE id = ?", (int(record_id),))
-    conn.commit()
-    print("Record deleted successfully.")
-    return True
-
-def get_youtube_videos(location):
-    """Fetch YouTube videos for a location."""
-    url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&q={location}+weather&type=video&key={YOUTUBE_API_KEY}&maxResults=3"
-    response = requests.get(url).json()
-    
-    if "items" in response:
-        videos = []
-        for item in response["items"]:
-            title = item["snippet"]["title"]
-            video_id = item["id"]["videoId"]
-            videos.append({"title": title, "url": f"https://www.youtube.com/watch?v={video_id}"})
-        return videos
-    return []
-
-def export_to_csv(filename="weather_data.csv"):
-    """Export weather data to CSV."""
-    cursor.execute("SELECT * FROM weather_requests")
-    rows = cursor.fetchall()
-    
-    with open(filename, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["ID", "Location", "Latitude", "Longitude", "Start Date", "End Date", "Temperature", "Description", "Request Time"])
-        writer.writerows(rows)
-    return filename
+# Time Trends ranges in days (None: all history)
+TREND_WINDOWS = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30, "Last year": 365, "All time": None}
+
+# Largest export offered as a download button. Streamlit keeps the whole
+# payload in memory to serve it; bigger exports point to the CLI or API.
+EXPORT_DOWNLOAD_MAX_BYTES = 200 * 1024 * 1024
 
 # Weather icon mapping
 def get_weather_icon(description):
@@ -178,7 +64,535 @@ def get_weather_icon(description):
         return "🌦️"
 
 # Streamlit UI
+# Injected once per full rerun; fragment reruns skip it
+APP_CSS = """
+<style>
+.main-header {
+    font-size: 3rem !important;
+    font-weight: 700;
+    color: #1E90FF;
+    text-align: center;
+    margin-bottom: 1rem;
+    text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
+}
+.subheader {
+    font-size: 1.8rem !important;
+    font-weight: 600;
+    color: #4682B4;
+    border-bottom: 2px solid #4682B4;
+    padding-bottom: 0.5rem;
+    margin-bottom: 1rem;
+}
+.card {
+    background-color: #f8f9fa;
+    border-radius: 10px;
+    padding: 20px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    margin-bottom: 20px;
+}
+.weather-display {
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    font-size: 1.5rem;
+    background: linear-gradient(120deg, #a1c4fd 0%, #c2e9fb 100%);
+    padding: 20px;
+    border-radius: 15px;
+    color: #333;
+    text-align: center;
+}
+.weather-icon {
+    font-size: 4rem;
+    margin-bottom: 10px;
+}
+.stButton button {
+    background-color: #4CAF50;
+    color: white;
+    border: none;
+    padding: 0.5rem 1rem;
+    border-radius: 5px;
+    transition: all 0.3s;
+}
+.stButton button:hover {
+    background-color: #45a049;
+    box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+}
+.delete-button button {
+    background-color: #f44336;
+}
+.delete-button button:hover {
+    background-color: #d32f2f;
+}
+.update-button button {
+    background-color: #2196F3;
+}
+.update-button button:hover {
+    background-color: #0b7dda;
+}
+.youtube-card {
+    background-color: #ffebee;
+    border-left: 5px solid #f44336;
+    padding: 10px;
+    margin-bottom: 10px;
+    border-radius: 5px;
+}
+</style>
+"""
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def requests_page_frame(sort_by, page_size, after, search, version):
+    """Return (formatted DataFrame, next cursor) for one View Requests page.
+
+    version is get_data_version(): any write to weather_requests changes it,
+    so cached pages are never served after the data they show has changed.
+    """
+    import pandas as pd
+    
+    rows, next_cursor = fetch_weather_requests_page(sort_by, page_size, after, search)
+    df = pd.DataFrame(rows, columns=["ID", "Location", "Latitude", "Longitude", "Start Date", "End Date", "Temperature", "Description", "Request Time"])
+    
+    # Format the DataFrame
+    df["Temperature"] = df["Temperature"].apply(lambda x: f"{x:.1f}°C")
+    df["Description"] = df["Description"].apply(lambda x: x.capitalize())
+    df["Request Time"] = df["Request Time"].apply(lambda x: x.split("T")[0])
+    return df, next_cursor
+
+# Page sections. Each is a fragment: its own widgets rerun only the section,
+# not main(), so the CSS, sidebar and other sections are left alone.
+def rerun_section():
+    """Rerun just the calling fragment, or the whole app if this is a full run."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="current_weather")
+def current_weather_section():
+    st.markdown('<h2 class="subheader">Current Weather</h2>', unsafe_allow_html=True)
+    
+    # Location input with autocomplete feel
+    location = st.text_input(
+        "Enter Location:",
+        placeholder="City name, ZIP code, or coordinates",
+        help="Separate several locations with ';'"
+    )
+    
+    # Autocomplete from previously saved locations
+    suggestions = [loc for loc in suggest_locations(location) if loc != location] if location and ";" not in location else []
+    if suggestions:
+        picked = st.pills("Saved locations:", suggestions)
+        if picked:
+            location = picked
+    
+    col_btn, col_refresh = st.columns([1, 3])
+    with col_btn:
+        get_weather = st.button("Get Weather", use_container_width=True)
+    with col_refresh:
+        force_refresh = st.checkbox("Force refresh", help="Skip cached weather and query the API")
+    
+    locations = split_locations(location)
+    if len(locations) > 1 and get_weather:
+        # Several locations: fill in a table as each result arrives
+        with st.spinner(f"Fetching weather for {len(locations)} locations..."):
+            table = st.empty()
+            results = []
+            
+            async def show_results():
+                import pandas as pd
+                async for loc, (temp, desc, lat, lng) in get_current_weather_many(locations, force_refresh=force_refresh):
+                    results.append({
+                        "Location": loc,
+                        "Weather": f"{get_weather_icon(desc)} {desc}" if desc else "Unavailable",
+                        "Temperature": f"{temp:.1f}°C" if temp is not None else "",
+                    })
+                    table.dataframe(pd.DataFrame(results), hide_index=True, use_container_width=True)
+            
+            asyncio.run(show_results())
+    
+    elif location and get_weather:
+        with st.spinner("Fetching weather data..."):
+            temp, desc, lat, lng = get_current_weather(location, force_refresh=force_refresh)
+            
+            if temp is not None:
+                weather_icon = get_weather_icon(desc)
+                
+                st.markdown(
+                    f"""
+                    <div class="weather-display">
+                        <div class="weather-icon">{weather_icon}</div>
+                        <div style="font-size: 2.5rem; font-weight: bold;">{temp}°C</div>
+                        <div style="text-transform: capitalize;">{desc}</div>
+                        <div style="font-size: 1.2rem; margin-top: 10px;">{label_coordinates(location, lat, lng)}</div>
+                        <div style="font-size: 0.9rem; opacity: 0.7;">Lat: {lat:.4f}, Long: {lng:.4f}</div>
+                    </div>
+                    """, 
+                    unsafe_allow_html=True
+                )
+                
+                nearby = [row for row in location_index.nearest(lat, lng, k=4, max_km=100)
+                          if normalize_location(row[1]) != normalize_location(location)][:3]
+                if nearby:
+                    st.caption("Nearby saved locations: " + ", ".join(
+                        f"{name} ({distance:.0f} km)" for distance, name, _, _ in nearby
+                    ))
+            else:
+                # Degraded answer: the last reading we stored for this place
+                fallback = last_known_weather(location)
+                if fallback is not None:
+                    observed_at, temp, desc = fallback
+                    st.warning(f"Live weather is unavailable right now (API errors or budget used up). "
+                               f"Last stored reading from {observed_at:%Y-%m-%d %H:%M}:")
+                    st.metric(location, f"{temp:.1f}°C", help=desc)
+                else:
+                    st.error("Couldn't fetch weather data. Please check the location or API keys.")
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="quick_stats")
+def quick_stats_section():
+    st.markdown('<h2 class="subheader">Quick Stats</h2>', unsafe_allow_html=True)
+    
+    # Get stats from the trigger-maintained summary tables (see aggregates.py)
+    total_requests, top_location, avg_temp = db.run(get_quick_stats)
+    top_location = top_location or "None"
+    
+    # Display metrics
+    st.metric("Total Weather Requests", total_requests)
+    st.metric("Most Searched Location", top_location)
+    if avg_temp:
+        st.metric("Average Temperature", f"{avg_temp:.1f}°C")
+    
+    # Show recent locations with minimize/expand
+    with st.expander("Recent Locations"):
+        recent = db.read("SELECT location, request_time FROM weather_requests ORDER BY request_time DESC LIMIT 5")
+        if recent:
+            for loc, requested in recent:
+                st.text(f"• {loc} ({requested[:10]})")
+        else:
+            st.text("No recent searches")
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="view_requests")
+def view_requests_section():
+    st.markdown('<h2 class="subheader">View Weather Requests</h2>', unsafe_allow_html=True)
+    
+    # Add search and filter options
+    col1, col2, col3 = st.columns([3, 2, 2])
+    with col1:
+        search = st.text_input("Search by location:", "")
+    with col2:
+        sort_by = st.selectbox("Sort by:", ["Newest First", "Oldest First", "Temperature (High to Low)", "Temperature (Low to High)"])
+    with col3:
+        limit = st.slider("Show entries:", 5, 50, 20)
+    
+    # Keyset pagination: session_state keeps the cursor of every page
+    # visited for this search/sort/page size, so Previous is a lookup.
+    page_key = ("view_pages", search.strip().lower(), sort_by, limit)
+    if st.session_state.get("view_page_key") != page_key:
+        st.session_state.view_page_key = page_key
+        st.session_state.view_cursors = [None]
+    cursors = st.session_state.view_cursors
+    
+    df, next_cursor = requests_page_frame(sort_by, limit, cursors[-1], search, get_data_version())
+    if df.empty and len(cursors) > 1:
+        # The page emptied out (e.g. rows were deleted); start again from the top
+        st.session_state.view_cursors = [None]
+        rerun_section()
+    total = count_weather_requests(search)
+    first_row = (len(cursors) - 1) * limit + 1
+    
+    if not df.empty:
+        # Display with highlighting
+        st.dataframe(
+            df, 
+            column_config={
+                "ID": st.column_config.NumberColumn("ID", width="small"),
+                "Location": st.column_config.TextColumn("Location", width="medium"),
+                "Temperature": st.column_config.TextColumn("Temp", width="small"),
+                "Description": st.column_config.TextColumn("Weather", width="medium"),
+                "Request Time": st.column_config.DateColumn("Date", width="small", format="YYYY-MM-DD"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+        
+        # Pagination controls
+        col1, col2, col3 = st.columns([1, 3, 1])
+        with col1:
+            if st.button("← Previous", disabled=len(cursors) == 1, use_container_width=True):
+                cursors.pop()
+                rerun_section()
+        with col2:
+            st.write("showing", first_row, "to", first_row + len(df) - 1, "of", total, "entries")
+        with col3:
+            if st.button("Next →", disabled=next_cursor is None, use_container_width=True):
+                cursors.append(next_cursor)
+                rerun_section()
+    else:
+        st.info("No weather requests found.")
+
+def record_picker(prefix, label):
+    """Multiselect over one page of requests at a time; returns the selected ids, or None if there are no records.
+
+    Pages are keyset cursors like View Requests, kept in session_state under prefix.
+    """
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        search = st.text_input("Search by location:", "", key=f"{prefix}_search")
+    with col2:
+        limit = st.slider("Records per page:", 10, 200, 50, step=10, key=f"{prefix}_limit")
+    
+    page_key = (search.strip().lower(), limit)
+    if st.session_state.get(f"{prefix}_page_key") != page_key:
+        st.session_state[f"{prefix}_page_key"] = page_key
+        st.session_state[f"{prefix}_cursors"] = [None]
+    cursors = st.session_state[f"{prefix}_cursors"]
+    
+    rows, next_cursor = fetch_weather_requests_page("Newest First", limit, cursors[-1], search)
+    if not rows and len(cursors) > 1:
+        st.session_state[f"{prefix}_cursors"] = [None]
+        rerun_section()
+    if not rows:
+        return None
+    
+    labels = {row[0]: f"ID: {row[0]} - {row[1]} ({row[4]}, {row[6]}°C, {row[7]})" for row in rows}
+    select_all = st.checkbox("Select all on this page", key=f"{prefix}_select_all")
+    selected = st.multiselect(
+        label,
+        options=list(labels),
+        default=list(labels) if select_all else [],
+        format_func=labels.get
+    )
+    
+    col1, col2, col3 = st.columns([1, 1, 3])
+    with col1:
+        if st.button("← Previous", disabled=len(cursors) == 1, use_container_width=True, key=f"{prefix}_previous"):
+            cursors.pop()
+            rerun_section()
+    with col2:
+        if st.button("Next →", disabled=next_cursor is None, use_container_width=True, key=f"{prefix}_next"):
+            cursors.append(next_cursor)
+            rerun_section()
+    with col3:
+        st.write(f"Page {len(cursors)} of {-(-count_weather_requests(search) // limit)}")
+    return selected
+
+def request_filter_form(prefix):
+    """Location, start date and temperature filters; returns request_filter_clause() keyword arguments."""
+    filters = {}
+    locations = st.multiselect("Locations:", list_locations(), key=f"{prefix}_locations")
+    if locations:
+        filters["locations"] = locations
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.checkbox("Filter by start date", key=f"{prefix}_by_date"):
+            filters["date_from"] = st.date_input("From date:", datetime.now().date() - timedelta(days=30),
+                                                 key=f"{prefix}_date_from")
+            filters["date_to"] = st.date_input("To date:", datetime.now().date(), key=f"{prefix}_date_to")
+    with col2:
+        if st.checkbox("Filter by temperature", key=f"{prefix}_by_temperature"):
+            filters["temp_min"], filters["temp_max"] = st.slider(
+                "Temperature range (°C):", -50.0, 50.0, (-50.0, 50.0), step=0.5, key=f"{prefix}_temperature"
+            )
+    return filters
+
+def choose_requests(action):
+    """Pick requests from a paged list or by filter; returns (bulk operation arguments, count), or (None, 0)."""
+    mode = st.radio("Choose records:", ["From a list", "By filter"], horizontal=True, key=f"{action}_mode")
+    if mode == "From a list":
+        selected = record_picker(action, f"Records to {action}:")
+        if selected is None:
+            st.info(f"No records available to {action}.")
+            return None, 0
+        return {"record_ids": selected}, len(selected)
+    
+    filters = request_filter_form(action)
+    if not filters:
+        st.info("Choose at least one filter.")
+        return None, 0
+    count = count_matching_requests(**filters) or 0
+    st.write(f"{count} matching record(s).")
+    return filters, count
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="update_requests")
+def update_requests_section():
+    st.markdown('<h2 class="subheader">Update Weather Request</h2>', unsafe_allow_html=True)
+    
+    if "update_notice" in st.session_state:
+        st.success(st.session_state.pop("update_notice"))
+    
+    targets, count = choose_requests("update")
+    if targets is None:
+        return
+    
+    if len(targets.get("record_ids", [])) == 1:
+        forecast = read_request_forecast(targets["record_ids"][0])
+        if forecast:
+            import pandas as pd
+            with st.expander("Daily forecast"):
+                st.dataframe(
+                    pd.DataFrame(forecast, columns=["Day", "Min °C", "Max °C", "Mean °C", "Description"]),
+                    hide_index=True
+                )
+    
+    with st.container():
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            change_temp = st.checkbox("Change temperature")
+            new_temp = st.number_input(
+                "New Temperature (°C):", 
+                min_value=-50.0, 
+                max_value=50.0, 
+                step=0.1,
+                disabled=not change_temp
+            )
+        with col2:
+            new_desc = st.text_input(
+                "New Weather Description:",
+                placeholder="e.g., sunny, cloudy, rainy"
+            )
+        
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            update_btn = st.button(f"Update {count} record(s)", disabled=not count or not (change_temp or new_desc),
+                                   use_container_width=True, key="update_button")
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    if update_btn:
+        with st.spinner("Updating records..."):
+            updated = update_weather_requests(
+                new_temp=new_temp if change_temp else None,
+                new_desc=new_desc or None,
+                **targets
+            )
+        if updated is None:
+            st.error("Failed to update records.")
+        else:
+            st.session_state.update_notice = f"Updated {updated} record(s)."
+            st.session_state.update_cursors = [None]
+            rerun_section()
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="delete_requests")
+def delete_requests_section():
+    st.markdown('<h2 class="subheader">Delete Weather Request</h2>', unsafe_allow_html=True)
+    
+    if "delete_notice" in st.session_state:
+        st.success(st.session_state.pop("delete_notice"))
+    
+    targets, count = choose_requests("delete")
+    if targets is None:
+        return
+    
+    # Deleting by filter can reach far more rows than are on screen, so ask first
+    confirmed = "record_ids" in targets or st.checkbox(f"Yes, permanently delete {count} matching record(s)")
+    delete_btn = st.button(f"Delete selected ({count})", disabled=not count or not confirmed, key="delete_selected")
+    
+    if delete_btn:
+        with st.spinner("Deleting..."):
+            deleted = delete_weather_requests(**targets)
+        if deleted is None:
+            st.error("Failed to delete records.")
+        else:
+            st.session_state.delete_notice = f"Deleted {deleted} record(s)."
+            st.session_state.delete_cursors = [None]
+            rerun_section()
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="histogram")
+def histogram_section():
+    import pandas as pd
+    
+    st.subheader("Temperature Distribution")
+    
+    # Show histogram of temperatures, indexed by bin midpoint
+    bins = st.slider("Histogram bins:", 5, 50, 20)
+    histogram = db.run(analysis.temperature_histogram, bins)
+    st.bar_chart(pd.Series(
+        [count for _, _, count in histogram],
+        index=[round((start + end) / 2, 1) for start, end, _ in histogram],
+        name="Requests"
+    ))
+    
+    # Show temperature stats (memoized in analysis.py)
+    summary = db.run(analysis.temperature_summary)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Minimum", f"{summary['min']:.1f}°C")
+    with col2:
+        st.metric("Maximum", f"{summary['max']:.1f}°C")
+    with col3:
+        st.metric("Average", f"{summary['mean']:.1f}°C")
+    with col4:
+        st.metric("Median", f"{summary['median']:.1f}°C")
+
+@st.fragment
+@metrics.timed("weather_ui_sections", sample=1, section="time_trends")
+def time_trends_section():
+    import pandas as pd
+    
+    st.subheader("Time Trends")
+    
+    # Observation history; the range decides which rollup level is read (see observations.py)
+    col1, col2 = st.columns(2)
+    with col1:
+        trend_location = st.selectbox(
+            "Location:",
+            [(observations.ALL_LOCATIONS, "All locations")] + db.run(observations.list_locations),
+            format_func=lambda item: item[1]
+        )
+    with col2:
+        trend_window = st.selectbox("Range:", list(TREND_WINDOWS))
+    
+    end = int(datetime.now().timestamp())
+    days = TREND_WINDOWS[trend_window]
+    start = end - days * 86400 if days else db.run(observations.earliest, trend_location[0]) or end
+    level, points = db.run(observations.series, trend_location[0], start, end)
+    if points:
+        trend = pd.DataFrame(points, columns=["ts", "Mean", "Min", "Max", "Samples"])
+        trend.index = pd.to_datetime(trend.pop("ts"), unit="s")
+        st.line_chart(trend[["Min", "Mean", "Max"]])
+        st.caption(f"{len(points)} points from {level} data")
+    else:
+        st.info("No observations in this range yet.")
+    
+    # Average by month of start date, Jan..Dec
+    st.subheader("Average by Request Month")
+    monthly_temps = pd.Series(
+        {month: mean or 0 for month, mean in db.run(analysis.monthly_means)}, name="Temperature"
+    )
+    st.line_chart(monthly_temps)
+
+def timing_panel(spans):
+    """Sidebar table of where this rerun's time went, from metrics.trace()."""
+    totals = {}
+    for name, labels, seconds in spans:
+        key = (name.removesuffix("_seconds"), ", ".join(f"{k}={v}" for k, v in labels.items()))
+        calls, total = totals.get(key, (0, 0.0))
+        totals[key] = (calls + 1, total + seconds)
+    with st.sidebar.expander("Rerun timings", expanded=True):
+        st.dataframe(
+            [{"Span": name, "Labels": labels, "Calls": calls, "Total ms": round(total * 1000, 2)}
+             for (name, labels), (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1])],
+            hide_index=True
+        )
+
 def main():
+    # Every span in this rerun is timed; fragment reruns are timed per section instead
+    with metrics.trace() as spans, metrics.timed("weather_ui_script_runs", sample=1):
+        render_page()
+    if st.session_state.get("show_timings"):
+        timing_panel(spans)
+
+def render_page():
+    # Background threads run once per server process, started with the UI rather than on import
+    start_background_tasks()
+    
     # App configuration
     st.set_page_config(
         page_title="Weather Explorer",
@@ -188,79 +602,7 @@ def main():
     )
 
     # Custom CSS for better styling
-    st.markdown("""
-    <style>
-    .main-header {
-        font-size: 3rem !important;
-        font-weight: 700;
-        color: #1E90FF;
-        text-align: center;
-        margin-bottom: 1rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-    }
-    .subheader {
-        font-size: 1.8rem !important;
-        font-weight: 600;
-        color: #4682B4;
-        border-bottom: 2px solid #4682B4;
-        padding-bottom: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    .card {
-        background-color: #f8f9fa;
-        border-radius: 10px;
-        padding: 20px;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        margin-bottom: 20px;
-    }
-    .weather-display {
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        font-size: 1.5rem;
-        background: linear-gradient(120deg, #a1c4fd 0%, #c2e9fb 100%);
-        padding: 20px;
-        border-radius: 15px;
-        color: #333;
-        text-align: center;
-    }
-    .weather-icon {
-        font-size: 4rem;
-        margin-bottom: 10px;
-    }
-    .stButton button {
-        background-color: #4CAF50;
-        color: white;
-        border: none;
-        padding: 0.5rem 1rem;
-        border-radius: 5px;
-        transition: all 0.3s;
-    }
-    .stButton button:hover {
-        background-color: #45a049;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-    }
-    .delete-button button {
-        background-color: #f44336;
-    }
-    .delete-button button:hover {
-        background-color: #d32f2f;
-    }
-    .update-button button {
-        background-color: #2196F3;
-    }
-    .update-button button:hover {
-        background-color: #0b7dda;
-    }
-    .youtube-card {
-        background-color: #ffebee;
-        border-left: 5px solid #f44336;
-        padding: 10px;
-        margin-bottom: 10px;
-        border-radius: 5px;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(APP_CSS, unsafe_allow_html=True)
 
     # App header
     st.markdown('<h1 class="main-header">🌦️ Weather Explorer</h1>', unsafe_allow_html=True)
@@ -300,75 +642,23 @@ def main():
         
         # Show current time
         st.write(f"📅 {datetime.now().strftime('%B %d, %Y %H:%M')}")
+        
+        with st.expander("API Stats"):
+            st.dataframe(get_api_stats(), hide_index=True)
+            st.dataframe(get_coalescing_stats(), hide_index=True)
+            st.dataframe(get_quota_usage(), hide_index=True)
+        
+        st.checkbox("Show timings", key="show_timings", help="Break down where this rerun's time went")
 
     # Main content area
     if main_choice == "Dashboard":
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            st.markdown('<h2 class="subheader">Current Weather</h2>', unsafe_allow_html=True)
-            
-            # Location input with autocomplete feel
-            location = st.text_input(
-                "Enter Location:",
-                placeholder="City name, ZIP code, or coordinates"
-            )
-            
-            col_btn, col_empty = st.columns([1, 3])
-            with col_btn:
-                get_weather = st.button("Get Weather", use_container_width=True)
-            
-            if location and get_weather:
-                with st.spinner("Fetching weather data..."):
-                    temp, desc, lat, lng = get_current_weather(location)
-                    
-                    if temp is not None:
-                        weather_icon = get_weather_icon(desc)
-                        
-                        st.markdown(
-                            f"""
-                            <div class="weather-display">
-                                <div class="weather-icon">{weather_icon}</div>
-                                <div style="font-size: 2.5rem; font-weight: bold;">{temp}°C</div>
-                                <div style="text-transform: capitalize;">{desc}</div>
-                                <div style="font-size: 1.2rem; margin-top: 10px;">{location}</div>
-                                <div style="font-size: 0.9rem; opacity: 0.7;">Lat: {lat:.4f}, Long: {lng:.4f}</div>
-                            </div>
-                            """, 
-                            unsafe_allow_html=True
-                        )
-                    else:
-                        st.error("Couldn't fetch weather data. Please check the location or API keys.")
+            current_weather_section()
         
         with col2:
-            st.markdown('<h2 class="subheader">Quick Stats</h2>', unsafe_allow_html=True)
-            
-            # Get stats from database
-            cursor.execute("SELECT COUNT(*) FROM weather_requests")
-            total_requests = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT location, COUNT(*) FROM weather_requests GROUP BY location ORDER BY COUNT(*) DESC LIMIT 1")
-            top_location_result = cursor.fetchone()
-            top_location = top_location_result[0] if top_location_result else "None"
-            
-            cursor.execute("SELECT AVG(temperature) FROM weather_requests")
-            avg_temp = cursor.fetchone()[0]
-            
-            # Display metrics
-            st.metric("Total Weather Requests", total_requests)
-            st.metric("Most Searched Location", top_location)
-            if avg_temp:
-                st.metric("Average Temperature", f"{avg_temp:.1f}°C")
-            
-            # Show recent locations with minimize/expand
-            with st.expander("Recent Locations"):
-                cursor.execute("SELECT location, request_time FROM weather_requests ORDER BY request_time DESC LIMIT 5")
-                recent = cursor.fetchall()
-                if recent:
-                    for loc, time in recent:
-                        st.text(f"• {loc} ({time[:10]})")
-                else:
-                    st.text("No recent searches")
+            quick_stats_section()
 
     elif main_choice == "Weather Requests":
         if submenu == "Create Request":
@@ -380,7 +670,11 @@ def main():
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    location = st.text_input("Location:", placeholder="Enter city, region, or coordinates")
+                    location = st.text_input(
+                        "Location:",
+                        placeholder="Enter city, region, or coordinates",
+                        help="Separate several locations with ';'"
+                    )
                 
                 with col2:
                     time_range = st.selectbox(
@@ -413,7 +707,21 @@ def main():
                 
                 st.markdown('</div>', unsafe_allow_html=True)
                 
-                if submit and location:
+                locations = split_locations(location)
+                if submit and len(locations) > 1:
+                    with st.spinner(f"Processing {len(locations)} locations..."):
+                        saved, failed = create_weather_requests(
+                            locations,
+                            start_date.strftime("%Y-%m-%d"),
+                            end_date.strftime("%Y-%m-%d")
+                        )
+                        
+                        if saved:
+                            st.success(f"Weather requests saved for: {', '.join(saved)}")
+                        if failed:
+                            st.error(f"Failed to create weather requests for: {', '.join(failed)}")
+                
+                elif submit and location:
                     with st.spinner("Processing your request..."):
                         success = create_weather_request(
                             location, 
@@ -423,215 +731,55 @@ def main():
                         
                         if success:
                             st.success(f"Weather request for {location} saved successfully!")
+                            # The forecast as stored with the request; no second upstream call
+                            forecast = read_request_forecast(success)
+                            if forecast:
+                                import pandas as pd
+                                st.dataframe(
+                                    pd.DataFrame(forecast, columns=["Day", "Min °C", "Max °C", "Mean °C", "Description"]),
+                                    hide_index=True
+                                )
                         else:
                             st.error("Failed to create weather request. Please check your inputs.")
 
         elif submenu == "View Requests":
-            st.markdown('<h2 class="subheader">View Weather Requests</h2>', unsafe_allow_html=True)
-            
-            # Add search and filter options
-            col1, col2, col3 = st.columns([3, 2, 2])
-            with col1:
-                search = st.text_input("Search by location:", "")
-            with col2:
-                sort_by = st.selectbox("Sort by:", ["Newest First", "Oldest First", "Temperature (High to Low)", "Temperature (Low to High)"])
-            with col3:
-                limit = st.slider("Show entries:", 5, 50, 20)
-            
-            # Build the query based on filters
-            query = "SELECT * FROM weather_requests"
-            params = []
-            
-            if search:
-                query += " WHERE location LIKE ?"
-                params.append(f"%{search}%")
-            
-            if sort_by == "Newest First":
-                query += " ORDER BY request_time DESC"
-            elif sort_by == "Oldest First":
-                query += " ORDER BY request_time ASC"
-            elif sort_by == "Temperature (High to Low)":
-                query += " ORDER BY temperature DESC"
-            elif sort_by == "Temperature (Low to High)":
-                query += " ORDER BY temperature ASC"
-            
-            query += f" LIMIT {limit}"
-            
-            # Execute the query
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            if rows:
-                # Convert to DataFrame for better display
-                df = pd.DataFrame(rows, columns=["ID", "Location", "Latitude", "Longitude", "Start Date", "End Date", "Temperature", "Description", "Request Time"])
-                
-                # Format the DataFrame
-                df["Temperature"] = df["Temperature"].apply(lambda x: f"{x:.1f}°C")
-                df["Description"] = df["Description"].apply(lambda x: x.capitalize())
-                df["Request Time"] = df["Request Time"].apply(lambda x: x.split("T")[0])
-                
-                # Display with highlighting
-                st.dataframe(
-                    df, 
-                    column_config={
-                        "ID": st.column_config.NumberColumn("ID", width="small"),
-                        "Location": st.column_config.TextColumn("Location", width="medium"),
-                        "Temperature": st.column_config.TextColumn("Temp", width="small"),
-                        "Description": st.column_config.TextColumn("Weather", width="medium"),
-                        "Request Time": st.column_config.DateColumn("Date", width="small", format="YYYY-MM-DD"),
-                    },
-                    hide_index=True,
-                    use_container_width=True
-                )
-                
-                # Pagination placeholder
-                col1, col2, col3 = st.columns([1, 3, 1])
-                with col2:
-                    st.write("showing 1 to", min(limit, len(rows)), "of", len(rows), "entries")
-            else:
-                st.info("No weather requests found.")
+            view_requests_section()
 
         elif submenu == "Update Request":
-            st.markdown('<h2 class="subheader">Update Weather Request</h2>', unsafe_allow_html=True)
-            
-            # First, let the user select a record
-            cursor.execute("SELECT id, location, temperature, weather_desc FROM weather_requests")
-            records = cursor.fetchall()
-            
-            if records:
-                record_options = {f"ID: {r[0]} - {r[1]} ({r[2]}°C, {r[3]})": r[0] for r in records}
-                
-                selected_record = st.selectbox(
-                    "Select a record to update:",
-                    options=list(record_options.keys())
-                )
-                
-                record_id = record_options[selected_record]
-                
-                with st.container():
-                    st.markdown('<div class="card">', unsafe_allow_html=True)
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        new_temp = st.number_input(
-                            "New Temperature (°C):", 
-                            min_value=-50.0, 
-                            max_value=50.0, 
-                            step=0.1
-                        )
-                    with col2:
-                        new_desc = st.text_input(
-                            "New Weather Description:",
-                            placeholder="e.g., sunny, cloudy, rainy"
-                        )
-                    
-                    col1, col2 = st.columns([1, 3])
-                    with col1:
-                        update_btn = st.button("Update Record", use_container_width=True, key="update_button")
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
-                    
-                    if update_btn:
-                        with st.spinner("Updating record..."):
-                            success = update_weather_request(
-                                record_id, 
-                                new_temp if new_temp != 0 else None, 
-                                new_desc if new_desc else None
-                            )
-                            
-                            if success:
-                                st.success(f"Record ID {record_id} updated successfully!")
-                            else:
-                                st.error("Failed to update record.")
-            else:
-                st.info("No records available to update.")
+            update_requests_section()
 
         elif submenu == "Delete Request":
-            st.markdown('<h2 class="subheader">Delete Weather Request</h2>', unsafe_allow_html=True)
-            
-            # Show all records with delete buttons
-            cursor.execute("SELECT id, location, start_date, temperature, weather_desc FROM weather_requests")
-            records = cursor.fetchall()
-            
-            if records:
-                st.write("Select a record to delete:")
-                
-                for i, (id, location, date, temp, desc) in enumerate(records):
-                    with st.container():
-                        cols = st.columns([3, 1])
-                        with cols[0]:
-                            st.write(f"**ID: {id} - {location}** ({date})")
-                            st.write(f"Temperature: {temp}°C, {desc}")
-                        with cols[1]:
-                            if st.button("Delete", key=f"del_{id}", use_container_width=True):
-                                with st.spinner("Deleting..."):
-                                    success = delete_weather_request(id)
-                                    if success:
-                                        st.success(f"Record ID {id} deleted successfully!")
-                                        st.rerun()  # Refresh the page
-                                    else:
-                                        st.error("Failed to delete record.")
-                        st.divider()
-            else:
-                st.info("No records available to delete.")
+            delete_requests_section()
 
     elif main_choice == "Weather Analysis":
         st.markdown('<h2 class="subheader">Weather Analysis & Trends</h2>', unsafe_allow_html=True)
         
-        # Get data for analysis
-        cursor.execute("SELECT location, temperature, start_date FROM weather_requests")
-        analysis_data = cursor.fetchall()
+        # Aggregates are computed in SQLite and memoized until the data changes (see analysis.py)
+        summary = db.run(analysis.temperature_summary)
         
-        if analysis_data:
-            # Convert to DataFrame
-            df = pd.DataFrame(analysis_data, columns=["Location", "Temperature", "Date"])
-            df["Date"] = pd.to_datetime(df["Date"])
-            df["Month"] = df["Date"].dt.strftime('%b')
-            
+        if summary["count"]:
             # Create tabs for different visualizations
             tabs = st.tabs(["Temperature Distribution", "Location Analysis", "Time Trends"])
             
             with tabs[0]:
-                st.subheader("Temperature Distribution")
-                
-                # Show histogram of temperatures
-                temp_hist_values = df["Temperature"].tolist()
-                st.bar_chart(df["Temperature"].value_counts().sort_index())
-                
-                # Show temperature stats
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Minimum", f"{df['Temperature'].min():.1f}°C")
-                with col2:
-                    st.metric("Maximum", f"{df['Temperature'].max():.1f}°C")
-                with col3:
-                    st.metric("Average", f"{df['Temperature'].mean():.1f}°C")
-                with col4:
-                    st.metric("Median", f"{df['Temperature'].median():.1f}°C")
+                histogram_section()
             
             with tabs[1]:
+                import pandas as pd
+                
                 st.subheader("Location Analysis")
                 
                 # Top locations by count
-                location_counts = df["Location"].value_counts().head(10)
+                location_counts = pd.Series(dict(db.run(analysis.top_locations, 10)), name="Requests")
                 st.bar_chart(location_counts)
                 
                 # Average temperature by location
-                location_temps = df.groupby("Location")["Temperature"].mean().sort_values(ascending=False)
+                location_temps = pd.Series(dict(db.run(analysis.location_means)), name="Temperature")
                 st.subheader("Average Temperature by Location")
                 st.bar_chart(location_temps)
             
             with tabs[2]:
-                st.subheader("Time Trends")
-                
-                # Group by month
-                if not df["Month"].empty:
-                    monthly_temps = df.groupby("Month")["Temperature"].mean()
-                    # Reorder months
-                    months_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                    monthly_temps = monthly_temps.reindex(months_order, fill_value=0)
-                    
-                    st.line_chart(monthly_temps)
+                time_trends_section()
         else:
             st.info("Not enough data for analysis. Please create some weather requests first.")
 
@@ -667,7 +815,11 @@ def main():
             st.markdown('<h2 class="subheader">Export Weather Data</h2>', unsafe_allow_html=True)
             
             # Add export options
-            export_format = st.radio("Select export format:", ["CSV", "JSON"])
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                export_format = st.radio("Select export format:", ["CSV", "JSON", "NDJSON", "Parquet"], horizontal=True)
+            with col2:
+                compress = st.checkbox("Gzip", disabled=export_format == "Parquet")
             
             # Add date range filter
             col1, col2 = st.columns(2)
@@ -677,8 +829,7 @@ def main():
                 date_to = st.date_input("To date:", datetime.now().date())
             
             # Add location filter
-            cursor.execute("SELECT DISTINCT location FROM weather_requests")
-            locations = [row[0] for row in cursor.fetchall()]
+            locations = list_locations()
             
             if locations:
                 selected_locations = st.multiselect("Filter by locations:", ["All"] + locations, default=["All"])
@@ -700,7 +851,7 @@ def main():
                 with st.spinner("Preparing export..."):
                     # Build the query
                     query = f"""
-                    SELECT * FROM weather_requests 
+                    SELECT {REQUEST_COLUMNS} FROM weather_requests 
                     WHERE start_date >= ? AND start_date <= ? 
                     {location_filter}
                     """
@@ -709,41 +860,37 @@ def main():
                     if location_filter and "All" not in selected_locations:
                         params.extend(selected_locations)
                     
-                    cursor.execute(query, params)
-                    export_data = cursor.fetchall()
-                    
-                    if export_data:
-                        column_names = ["ID", "Location", "Latitude", "Longitude", "Start Date", "End Date", "Temperature", "Weather Description", "Request Time"]
-                        df = pd.DataFrame(export_data, columns=column_names)
-                        
-                        if export_format == "CSV":
-                            filename = "weather_data_export.csv"
-                            df.to_csv(filename, index=False)
-                            
-                            with open(filename, "rb") as file:
-                                st.download_button(
-                                    label="Download CSV",
-                                    data=file,
-                                    file_name=filename,
-                                    mime="text/csv",
-                                    key="download-csv"
+                    # Stream the result into a temporary file private to this run
+                    fmt = export_format.lower()
+                    try:
+                        export_file, exported = db.run(export_query, query, params, EXPORT_COLUMNS, fmt, compress, op="export")
+                    except RuntimeError as e:  # e.g. pyarrow missing for Parquet
+                        st.error(str(e))
+                    else:
+                        with export_file:
+                            size = export_file.seek(0, 2)
+                            export_file.seek(0)
+                            if exported and size > EXPORT_DOWNLOAD_MAX_BYTES:
+                                st.warning(
+                                    f"This export is {size / 2**20:,.0f} MB, more than the "
+                                    f"{EXPORT_DOWNLOAD_MAX_BYTES // 2**20} MB a browser download can hold in memory. "
+                                    "Narrow the date range or locations, tick Gzip, or export from the command line "
+                                    "(`python cli.py export`) or the HTTP API (`GET /export` on service.py), "
+                                    "which stream the file."
                                 )
-                        else:  # JSON
-                            filename = "weather_data_export.json"
-                            df.to_json(filename, orient="records", date_format="iso")
-                            
-                            with open(filename, "rb") as file:
+                            elif exported:
                                 st.download_button(
-                                    label="Download JSON",
-                                    data=file,
-                                    file_name=filename,
-                                    mime="application/json",
-                                    key="download-json"
+                                    label=f"Download {export_format}",
+                                    # Streamlit keeps its own copy of the payload to serve it
+                                    data=export_file.read(),
+                                    file_name=export_filename("weather_data_export", fmt, compress),
+                                    mime=export_mime(fmt, compress),
+                                    key=f"download-{fmt}"
                                 )
-                        
-                        st.success(f"Export complete! {len(export_data)} records exported.")
-                    else:
-                        st.warning("No data found matching your criteria.")
+                                
+                                st.success(f"Export complete! {exported} records exported.")
+                            else:
+                                st.warning("No data found matching your criteria.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""Measure cold-start import latency of the core module and the Streamlit UI.
+
+Usage:
+    python benchmarks/bench_import.py [--repeats 7] [--root PATH] [module ...]
+
+Each sample imports the module in a fresh interpreter, started in an empty
+temporary directory so nothing is cached between runs and any file created
+on import (e.g. weather_app.db) shows up. Reports the median time spent in
+the import statement and for the whole process, which heavy dependencies
+got loaded, and the files the import left behind. --root points at another
+checkout, e.g. to compare against an older revision.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+HEAVY_MODULES = ["streamlit", "pandas", "requests", "pyarrow"]
+
+_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules],
+                   "files": sorted(os.listdir("."))}}))
+"""
+
+
+def sample(module, root):
+    """Import module in a fresh interpreter; return (import seconds, process seconds, loaded, files)."""
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(root), PYTHONDONTWRITEBYTECODE="1")
+    try:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        )
+        wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe["import"], wall, probe["loaded"], probe["files"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold imports of the core module and the UI.")
+    parser.add_argument("modules", nargs="*", default=["core", "app"])
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--root", default=ROOT, help="checkout to import from (default: this one)")
+    args = parser.parse_args()
+
+    print(f"median of {args.repeats} cold imports (ms)")
+    print(f"{'module':10} {'import':>8} {'process':>8}  loaded / files created")
+    for module in args.modules:
+        samples = [sample(module, args.root) for _ in range(args.repeats)]
+        imported = statistics.median(s[0] for s in samples) * 1000
+        wall = statistics.median(s[1] for s in samples) * 1000
+        _, _, loaded, files = samples[-1]
+        print(f"{module:10} {imported:8.1f} {wall:8.1f}  {', '.join(loaded) or '-'} / {', '.join(files) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
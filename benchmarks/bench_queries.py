@@ -0,0 +1,66 @@
+"""Time the Streamlit UI's SQL queries before and after the schema migrations.
+
+Usage:
+    python benchmarks/bench_queries.py [--rows 1000000] [--repeat 5]
+
+Builds a throwaway database at schema version 1 (the original table with no
+indexes), times each query, migrates to the latest version and times again.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import migrations
+from datagen import populate
+
+QUERIES = {
+    "recent locations": ("SELECT location, request_time FROM weather_requests ORDER BY request_time DESC LIMIT 5", ()),
+    "most searched": ("SELECT location, COUNT(*) FROM weather_requests GROUP BY location ORDER BY COUNT(*) DESC LIMIT 1", ()),
+    "location search": ("SELECT id FROM weather_requests WHERE location LIKE ? ORDER BY request_time DESC LIMIT 20",
+                        ("%berlin 3%",)),
+    "export date range": ("SELECT id, location FROM weather_requests WHERE start_date >= ? AND start_date <= ?",
+                          ("2023-03-01", "2023-03-31")),
+    "distinct locations": ("SELECT DISTINCT location FROM weather_requests", ()),
+}
+
+
+def time_queries(conn, repeat):
+    timings = {}
+    for name, (sql, params) in QUERIES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrations.connect(os.path.join(tmp, "bench.db"), target=1)
+        start = time.perf_counter()
+        populate(conn, args.rows)
+        print(f"Inserted {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        before = time_queries(conn, args.repeat)
+        migrations.migrate(conn)
+        after = time_queries(conn, args.repeat)
+        conn.close()
+
+    print(f"{'query':<22}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in QUERIES:
+        print(f"{name:<22}{before[name] * 1000:>14.2f}{after[name] * 1000:>14.2f}{before[name] / after[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
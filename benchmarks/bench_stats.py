@@ -0,0 +1,68 @@
+"""Compare Quick Stats computed by full-table aggregates with the summary tables.
+
+Usage:
+    python benchmarks/bench_stats.py [--rows 1000000] [--repeat 5]
+
+Also reports the insert throughput cost of the maintaining triggers.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import aggregates
+import migrations
+from datagen import populate
+
+SCAN_QUERIES = [
+    "SELECT COUNT(*) FROM weather_requests",
+    "SELECT location, COUNT(*) FROM weather_requests GROUP BY location ORDER BY COUNT(*) DESC LIMIT 1",
+    "SELECT AVG(temperature) FROM weather_requests",
+]
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def timed_populate(path, rows, target):
+    conn = migrations.connect(path, target=target)
+    start = time.perf_counter()
+    populate(conn, rows)
+    return conn, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain, plain_insert = timed_populate(os.path.join(tmp, "plain.db"), args.rows, 4)
+        summarized, summarized_insert = timed_populate(os.path.join(tmp, "summarized.db"), args.rows, None)
+
+        scan = best_of(args.repeat, lambda: [plain.execute(q).fetchall() for q in SCAN_QUERIES])
+        summary = best_of(args.repeat, lambda: aggregates.get_quick_stats(summarized))
+        check = best_of(1, lambda: aggregates.check(summarized))
+        plain.close()
+        summarized.close()
+
+    print(f"rows: {args.rows}")
+    print(f"quick stats, full scans:     {scan * 1000:10.2f} ms")
+    print(f"quick stats, summary tables: {summary * 1000:10.2f} ms")
+    print(f"insert, schema v4:          {args.rows / plain_insert:10.0f} rows/s")
+    print(f"insert, with summaries:     {args.rows / summarized_insert:10.0f} rows/s")
+    print(f"consistency check:           {check * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
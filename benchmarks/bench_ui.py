@@ -0,0 +1,111 @@
+"""Measure server time per UI interaction with Streamlit's AppTest.
+
+Usage:
+    python benchmarks/bench_ui.py [--rows 2000] [--repeats 5]
+
+Builds a synthetic database in a temporary directory, points the API
+clients at the stub server and replays common interactions: loading the
+Dashboard, moving the histogram slider, searching and resizing View
+Requests, and opening Delete Request. AppTest always re-executes the whole
+script, so "full rerun" is what each interaction costs without fragments.
+The "fragment rerun" column times just the section function that a
+fragment rerun executes, where app.py defines one.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import migrations
+from datagen import populate
+from stub_server import StubServer
+
+
+def _widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+def _run_section(name):
+    # AppTest.from_function runs this function's source as the script
+    import app
+    getattr(app, name)()
+
+
+def _timed(run, repeats):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        run(i)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time UI interactions with and without fragment reruns.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    from streamlit.testing.v1 import AppTest
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    # Before populate(), which imports core: core reads the API endpoints on import
+    server = StubServer(latency=0).start()
+    os.environ.update(server.environ())
+    conn = migrations.connect("weather_app.db")
+    populate(conn, args.rows)
+    conn.close()
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.run()
+    import app
+
+    def navigate(main_choice, submenu=None):
+        at.sidebar.radio[0].set_value(main_choice).run()
+        if submenu:
+            at.sidebar.radio[1].set_value(submenu).run()
+
+    def fragment(name):
+        # A fragment rerun executes only the section function
+        if not hasattr(app, name):
+            return None
+        test = AppTest.from_function(_run_section, args=(name,), default_timeout=120)
+        test.run()
+        return _timed(lambda i: test.run(), args.repeats)
+
+    results = []
+
+    results.append(("Dashboard rerun", _timed(lambda i: at.run(), args.repeats), fragment("quick_stats_section")))
+
+    navigate("Weather Analysis")
+    slider = lambda i: _widget(at.slider, "Histogram bins:").set_value(10 + i % 2).run()
+    results.append(("Analysis: move bins slider", _timed(slider, args.repeats), fragment("histogram_section")))
+
+    navigate("Weather Requests", "View Requests")
+    search = lambda i: _widget(at.text_input, "Search by location:").set_value(["Par", "Lon"][i % 2]).run()
+    results.append(("View: change search", _timed(search, args.repeats), fragment("view_requests_section")))
+    size = lambda i: _widget(at.slider, "Show entries:").set_value([10, 30][i % 2]).run()
+    results.append(("View: change page size", _timed(size, args.repeats), fragment("view_requests_section")))
+
+    navigate("Weather Requests", "Delete Request")
+    results.append(("Delete: rerun page", _timed(lambda i: at.run(), args.repeats), fragment("delete_requests_section")))
+
+    print(f"{args.rows} rows, median of {args.repeats} runs (ms)")
+    print(f"{'interaction':32} {'full rerun':>12} {'fragment rerun':>16}")
+    for name, full, partial in results:
+        partial = "-" if partial is None else f"{partial:.1f}"
+        print(f"{name:32} {full:12.1f} {partial:>16}")
+
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
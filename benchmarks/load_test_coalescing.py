@@ -0,0 +1,61 @@
+"""Load-test request coalescing: many sessions asking for the same city at once.
+
+Usage:
+    python benchmarks/load_test_coalescing.py [--callers 200] [--latency 0.2] [--location Paris]
+
+Starts the stub APIs (stub_server.py), imports core.py against them with a
+fresh database in a temporary directory, then releases --callers threads
+together, each calling get_current_weather(location) with cold caches. With
+single-flight coalescing the stub should see one geocoding call and one
+weather call; the script exits non-zero otherwise.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from stub_server import StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent identical lookups share one upstream call.")
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub response latency in seconds")
+    parser.add_argument("--location", default="Paris")
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency).start()
+    os.environ.update(server.environ())
+    os.chdir(tempfile.mkdtemp())
+    import core
+
+    barrier = threading.Barrier(args.callers)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(core.get_current_weather(args.location))
+
+    threads = [threading.Thread(target=call) for _ in range(args.callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    upstream = sum(server.counts.values())
+    print(f"{args.callers} callers in {elapsed:.2f}s, {upstream} upstream calls: {dict(server.counts)}")
+    for stats in core.get_coalescing_stats():
+        print(f"  {stats['cache']}: {stats['issued']} issued, {stats['coalesced']} coalesced")
+    distinct = set(results)
+    print(f"  {len(distinct)} distinct result(s): {distinct}")
+    sys.exit(0 if server.counts["geocode/json"] == 1 and server.counts["weather"] == 1 and len(distinct) == 1 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Load-test db.Database with many simulated concurrent Streamlit sessions.
+
+Usage:
+    python benchmarks/load_test_db.py [--sessions 50] [--seconds 10] [--rows 100000] [--write-ratio 0.1]
+
+Each session thread loops over a mix of the UI's reads (a View Requests page,
+Quick Stats, Recent Locations) and, with probability --write-ratio, inserts
+a request. --mode shared runs the same workload against one connection
+guarded by a lock, which is how a single module-level connection behaves.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import aggregates
+import migrations
+from core import INSERT_REQUEST_SQL
+from datagen import generate_rows, populate
+from db import Database
+
+READS = [
+    "SELECT id, location, temperature, request_time FROM weather_requests ORDER BY request_time DESC, id DESC LIMIT 20",
+    "SELECT location, request_time FROM weather_requests ORDER BY request_time DESC LIMIT 5",
+]
+
+
+class SharedConnection:
+    """Baseline: one connection shared by every thread behind a lock."""
+
+    def __init__(self, path):
+        self._conn = migrations.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def read(self, query, params=()):
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def quick_stats(self):
+        with self._lock:
+            return aggregates.get_quick_stats(self._conn)
+
+    def insert(self, row):
+        with self._lock:
+            self._conn.execute(INSERT_REQUEST_SQL, row)
+            self._conn.commit()
+
+
+class ManagedDatabase:
+    def __init__(self, path):
+        self._db = Database(path)
+
+    def read(self, query, params=()):
+        return self._db.read(query, params)
+
+    def quick_stats(self):
+        return self._db.run(aggregates.get_quick_stats)
+
+    def insert(self, row):
+        self._db.execute(INSERT_REQUEST_SQL, row)
+
+
+def session(store, deadline, write_ratio, seed, latencies, errors):
+    rng = random.Random(seed)
+    rows = generate_rows(10 ** 9, seed=seed)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                store.insert(next(rows))
+            else:
+                store.read(rng.choice(READS))
+                store.quick_stats()
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--mode", choices=["db", "shared"], default="db")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        conn = migrations.connect(path)
+        populate(conn, args.rows)
+        conn.close()
+
+        store = ManagedDatabase(path) if args.mode == "db" else SharedConnection(path)
+        latencies, errors = [], []
+        deadline = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(target=session, args=(store, deadline, args.write_ratio, i, latencies, errors))
+            for i in range(args.sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    latencies.sort()
+    print(f"mode={args.mode} sessions={args.sessions} write_ratio={args.write_ratio}")
+    print(f"operations: {len(latencies)} ({len(latencies) / args.seconds:.0f}/s), errors: {len(errors)}")
+    if latencies:
+        print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms, "
+              f"max {latencies[-1] * 1000:.2f} ms")
+    for error in sorted(set(errors))[:5]:
+        print("  ", error)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Load-test the HTTP API (service.py) with keep-alive clients.
+
+Usage:
+    python benchmarks/load_test_service.py [--rows 100000] [--clients 32] [--seconds 5]
+
+Fills a database in a temporary directory, starts service.py on it in a
+subprocess and drives it from --clients concurrent keep-alive connections
+for each scenario: a page of the list endpoint, the same page revalidated
+with If-None-Match (304), a single record, and a search. Prints requests
+per second and latency percentiles per scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import migrations
+from datagen import populate
+
+
+async def _get(reader, writer, path, headers=""):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "etag":
+            etag = value.strip()
+    body = await reader.readexactly(length)
+    return status, etag, body
+
+
+async def _scenario(port, path, clients, seconds, headers=""):
+    latencies, statuses = [], set()
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _, _ = await _get(reader, writer, path, headers)
+            latencies.append(time.perf_counter() - start)
+            statuses.add(status)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (len(latencies) / elapsed, statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000, sorted(statuses))
+
+
+async def _run(port, args):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    _, etag, body = await _get(reader, writer, "/requests?limit=20")
+    record_id = json.loads(body)["items"][0]["id"]
+    writer.close()
+
+    scenarios = [
+        ("list page (limit 20)", "/requests?limit=20", ""),
+        ("list page, If-None-Match", "/requests?limit=20", f"If-None-Match: {etag}\r\n"),
+        ("single record", f"/requests/{record_id}", ""),
+        ("search 'par'", "/requests?limit=20&search=par", ""),
+    ]
+    print(f"{args.rows} rows, {args.clients} clients, {args.seconds}s per scenario")
+    print(f"{'scenario':28} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+    for name, path, headers in scenarios:
+        rps, p50, p99, statuses = await _scenario(port, path, args.clients, args.seconds, headers)
+        print(f"{name:28} {rps:9.0f} {p50:8.2f} {p99:8.2f}  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput of the HTTP API.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    conn = migrations.connect(os.path.join(workdir, "weather_app.db"))
+    populate(conn, args.rows)
+    conn.close()
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "service.py"), "--port", str(port)],
+        cwd=workdir, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        server.stdout.readline()  # "Weather API on ..." once listening
+        asyncio.run(_run(port, args))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Local stand-in for the Google Maps, OpenWeather and YouTube APIs.
+
+Usage:
+    python benchmarks/stub_server.py [--port 8000] [--latency 0.05] [--jitter 0] [--error-rate 0]
+
+Then start the app against it:
+    GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8000 OPENWEATHER_BASE_URL=http://127.0.0.1:8000 \\
+    YOUTUBE_BASE_URL=http://127.0.0.1:8000 streamlit run app.py
+
+Responses are deterministic per location/coordinates and follow the shape
+of the real APIs closely enough for app.py. Each response is delayed by
+latency plus a uniform random 0..jitter seconds, and a fraction error_rate
+of requests fail with error_status (503 by default; 429 exercises the
+clients' rate-limit handling). Every request is counted per endpoint in
+StubServer.counts and every injected failure in StubServer.errors.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _geocode(params):
+    h = zlib.crc32(params.get("address", "").strip().lower().encode())
+    return {"status": "OK", "results": [{"geometry": {"location": {
+        "lat": round((h % 17000) / 100 - 85, 4),
+        "lng": round((h // 17000 % 36000) / 100 - 180, 4),
+    }}}]}
+
+
+def _weather(params):
+    lat = float(params.get("lat", 0))
+    return {"cod": 200, "main": {"temp": round(30 - abs(lat) / 3, 2)}, "weather": [{"description": "clear sky"}]}
+
+
+def _forecast(params):
+    lat = float(params.get("lat", 0))
+    now = int(time.time())
+    start = now - now % 10800
+    return {"cod": "200", "city": {"timezone": 0}, "list": [
+        {"dt": start + i * 10800, "main": {"temp": round(30 - abs(lat) / 3 + (i % 8) - 4, 2)},
+         "weather": [{"description": "light rain" if i % 5 == 0 else "clear sky"}]}
+        for i in range(40)
+    ]}
+
+
+def _search(params):
+    return {"items": [
+        {"id": {"videoId": f"video{i}"}, "snippet": {"title": f"{params.get('q', '')} #{i}"}} for i in range(3)
+    ]}
+
+
+ROUTES = {"geocode/json": _geocode, "weather": _weather, "forecast": _forecast, "search": _search}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, jitter=0, error_rate=0, error_status=503, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.counts = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        """Serve from a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def environ(self):
+        """Environment variables that point app.py at this server."""
+        return {name: self.url for name in ("GOOGLE_MAPS_BASE_URL", "OPENWEATHER_BASE_URL", "YOUTUBE_BASE_URL")}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = url.path.strip("/")
+        server = self.server
+        with server._lock:
+            server.counts[route] += 1
+            delay = server.latency + server._random.uniform(0, server.jitter)
+            failed = server._random.random() < server.error_rate
+            if failed:
+                server.errors[route] += 1
+        handler = ROUTES.get(route)
+        if handler is None:
+            self.send_error(404)
+            return
+        time.sleep(delay)
+        if failed:
+            status, body = server.error_status, json.dumps({"error": {"message": "injected failure"}}).encode()
+        else:
+            status, body = 200, json.dumps(handler({k: v[0] for k, v in parse_qs(url.query).items()})).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub weather, geocoding and video APIs.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many further seconds, uniformly random")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed requests")
+    parser.add_argument("--seed", type=int, help="seed for latency jitter and failures")
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    print(f"Stub APIs on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
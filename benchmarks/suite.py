@@ -0,0 +1,266 @@
+"""Offline benchmark suite: UI queries, exports, analysis and concurrent fetches.
+
+Usage:
+    python benchmarks/suite.py [--rows 10k] [--db PATH] [--repeat 5] [--output FILE] [--compare FILE]
+
+Runs against a synthetic database (datagen.py) and the stub APIs
+(stub_server.py), so nothing leaves the machine:
+
+    db        each query the UI issues: Quick Stats, recent locations, View
+              Requests pages in every sort order, search, counts,
+              autocomplete, the Update/Delete and Export pickers and the
+              Time Trends series
+    export    the Export Data path in every format, full table and one month
+    analysis  the Weather Analysis aggregates, uncached
+    fetch     get_current_weather_batch() over cold caches at several
+              concurrency levels, against stub latency, jitter and errors
+
+Without --db the database is built in a temporary directory. With --db it
+is built there once (10m rows takes a while, see datagen.py) and reused on
+later runs, so commits can be compared on identical data. Results are
+written as JSON (default bench_<commit>_<rows>.json) with the commit,
+Python and SQLite versions. --compare prints each benchmark against an
+earlier results file and exits non-zero when one got slower than
+--threshold times its baseline and by more than --min-delta milliseconds,
+so that jitter in sub-millisecond queries is not reported.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import analysis
+import migrations
+import observations
+from aggregates import get_quick_stats
+from datagen import parse_count, populate
+from export import export_query
+from stub_server import StubServer
+
+
+def clock(func, repeat):
+    """Run func repeat times; return timings in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000,
+            "max_ms": max(times) * 1000, "runs": repeat}
+
+
+def db_benchmarks(core):
+    db = core.db
+    _, cursor = core.fetch_weather_requests_page("Newest First", 20)
+    search_clause, search_params = core.location_search_clause("berlin")
+    end = int(time.time())
+    start = db.run(observations.earliest) or end
+    return {
+        "quick_stats": lambda: db.run(get_quick_stats),
+        "recent_locations": lambda: db.read(
+            "SELECT location, request_time FROM weather_requests ORDER BY request_time DESC LIMIT 5"),
+        "page_newest": lambda: core.fetch_weather_requests_page("Newest First", 20),
+        "page_newest_next": lambda: core.fetch_weather_requests_page("Newest First", 20, cursor),
+        "page_oldest": lambda: core.fetch_weather_requests_page("Oldest First", 20),
+        "page_temperature": lambda: core.fetch_weather_requests_page("Temperature (High to Low)", 20),
+        "page_search": lambda: core.fetch_weather_requests_page("Newest First", 20, None, "berlin"),
+        "page_search_short": lambda: core.fetch_weather_requests_page("Newest First", 20, None, "pa"),
+        # count_weather_requests() caches search counts, so time the query it runs
+        "count_search": lambda: db.read_one(f"SELECT COUNT(*) FROM weather_requests WHERE {search_clause}",
+                                            search_params),
+        "suggest_locations": lambda: core.suggest_locations("ber"),
+        "distinct_locations": lambda: db.read("SELECT DISTINCT location FROM weather_requests"),
+        "filter_locations": lambda: core.list_locations(),
+        "filter_count": lambda: core.count_matching_requests(locations=["Paris", "Berlin 3"], temp_min=10),
+        "trend_locations": lambda: db.run(observations.list_locations),
+        "trend_series_all": lambda: db.run(observations.series, observations.ALL_LOCATIONS, start, end),
+    }
+
+
+def export_benchmarks(core):
+    def export(fmt, compress=False, month=False):
+        query = f"SELECT {core.REQUEST_COLUMNS} FROM weather_requests"
+        params = []
+        if month:
+            query += " WHERE start_date >= ? AND start_date <= ?"
+            params = ["2023-03-01", "2023-03-31"]
+        return lambda: core.db.run(export_query, query, params, core.EXPORT_COLUMNS, fmt, compress)[0].close()
+
+    benchmarks = {
+        "csv": export("csv"),
+        "csv_gzip": export("csv", compress=True),
+        "ndjson": export("ndjson"),
+        "json": export("json"),
+        "csv_one_month": export("csv", month=True),
+    }
+    if importlib.util.find_spec("pyarrow") is None:
+        print("pyarrow not installed; skipping the Parquet export")
+    else:
+        benchmarks["parquet"] = export("parquet")
+    return benchmarks
+
+
+def analysis_benchmarks(core):
+    # __wrapped__ skips memoize_on_version, so every run does the work
+    run = core.db.run
+    return {
+        "temperature_summary": lambda: run(analysis.temperature_summary.__wrapped__),
+        "temperature_histogram": lambda: run(analysis.temperature_histogram.__wrapped__, 20),
+        "top_locations": lambda: run(analysis.top_locations.__wrapped__, 10),
+        "location_means": lambda: run(analysis.location_means.__wrapped__),
+        "monthly_means": lambda: run(analysis.monthly_means.__wrapped__),
+    }
+
+
+def fetch_benchmarks(core, server, args):
+    results = {}
+    core.get_current_weather("Suite Warmup")  # creates clients and warms the geocode cache from the table
+    for concurrency in args.concurrency:
+        # Names no earlier run has used, so every lookup misses the caches
+        nonce = uuid.uuid4().hex[:8]
+        locations = [f"Suite {nonce} {i}" for i in range(args.locations)]
+        calls, errors = sum(server.counts.values()), sum(server.errors.values())
+        start = time.perf_counter()
+        fetched = core.get_current_weather_batch(locations, concurrency)
+        elapsed = time.perf_counter() - start
+        results[f"concurrency_{concurrency}"] = {
+            "median_ms": elapsed * 1000, "runs": 1, "locations": len(locations),
+            "per_second": len(locations) / elapsed,
+            "failed": sum(1 for temp, *_ in fetched.values() if temp is None),
+            "upstream_calls": sum(server.counts.values()) - calls,
+            "injected_errors": sum(server.errors.values()) - errors,
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Print results against a baseline results file; return the names that got slower."""
+    slower = []
+    print(f"\n{'benchmark':40} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for group, benchmarks in results["results"].items():
+        for name, result in benchmarks.items():
+            before = baseline["results"].get(group, {}).get(name)
+            if before is None:
+                continue
+            ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            lost = result["median_ms"] - before["median_ms"]
+            flag = "  slower" if ratio > threshold and lost > min_delta else ""
+            if flag:
+                slower.append(f"{group}.{name}")
+            print(f"{group + '.' + name:40} {before['median_ms']:10.2f} {result['median_ms']:10.2f} {ratio:6.2f}x{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite and write JSON results.")
+    parser.add_argument("--rows", default="10k", help="rows to generate, e.g. 10k, 1m or 10m (default: 10k)")
+    parser.add_argument("--db", help="database to reuse, created with --rows if missing")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--groups", default="db,export,analysis,fetch", help="comma-separated groups to run")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random stub latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="fraction of stub responses that fail")
+    parser.add_argument("--locations", type=int, default=200, help="distinct locations per fetch run")
+    parser.add_argument("--concurrency", type=lambda s: [int(n) for n in s.split(",")], default=[1, 16, 64],
+                        help="comma-separated fetch concurrency levels (default: 1,16,64)")
+    parser.add_argument("--output", help="results file (default: bench_<commit>_<rows>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio that counts as slower (default: 1.2)")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="milliseconds a benchmark must also lose to count as slower (default: 1)")
+    args = parser.parse_args()
+    groups = args.groups.split(",")
+
+    # Before populate(), which imports core: core reads the API endpoints on import
+    server = StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=42).start()
+    os.environ.update(server.environ())
+
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp()
+    path = os.path.abspath(args.db) if args.db else os.path.join(workdir, "weather_app.db")
+    if not os.path.exists(path):
+        print(f"Generating {args.rows} rows in {path}...")
+        start = time.perf_counter()
+        conn = migrations.connect(path)
+        populate(conn, parse_count(args.rows), history=True)
+        conn.close()
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    os.chdir(workdir)  # anything core writes besides the database (e.g. CSV exports) stays here
+    import core
+    core.DB_PATH = path
+    for limits in core.RATE_LIMITS.values():
+        limits.update(per_second=10000, burst=10000, per_day=10 ** 9)
+
+    rows = core.db.read_one("SELECT COUNT(*) FROM weather_requests")[0]
+    results = {}
+    try:
+        for group, build in [("db", db_benchmarks), ("export", export_benchmarks), ("analysis", analysis_benchmarks)]:
+            if group not in groups:
+                continue
+            repeat = min(args.repeat, 3) if group == "export" else args.repeat
+            results[group] = {}
+            for name, func in build(core).items():
+                if group != "export":
+                    func()  # warm the page cache; exports read the whole table anyway
+                results[group][name] = clock(func, repeat)
+                print(f"{group + '.' + name:40} {results[group][name]['median_ms']:10.2f} ms")
+        if "fetch" in groups:
+            results["fetch"] = fetch_benchmarks(core, server, args)
+            for name, result in results["fetch"].items():
+                print(f"{'fetch.' + name:40} {result['per_second']:10.1f} locations/s, "
+                      f"{result['failed']} failed, {result['injected_errors']} injected errors")
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "rows": rows,
+            "repeat": args.repeat,
+            "stub": {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate},
+        },
+        "results": results,
+    }
+    output = args.output or f"bench_{commit or 'local'}_{args.rows.lower()}.json"
+    with open(output, "w") as out:
+        json.dump(report, out, indent=2)
+    print(f"Wrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(report, json.load(f), args.threshold, args.min_delta)
+        if slower:
+            print(f"{len(slower)} benchmark(s) slower than {args.threshold}x baseline: {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
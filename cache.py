@@ -0,0 +1,431 @@
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+from ratelimit import BACKGROUND, priority
+
+# Registry of in-process tiers. app.py is re-executed by Streamlit on every
+# rerun, so anything created there is thrown away; tiers living here survive.
+_shared_tiers = {}
+_shared_lock = threading.RLock()
+
+
+def normalize_location(location):
+    """Normalize a free-text location into a cache key ("  New  York " -> "new york")."""
+    return " ".join(str(location).lower().split())
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional per-entry expiry."""
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = Counter()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if full."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def shared(name, factory):
+    """Return the process-wide object registered under name, creating it with factory on first use."""
+    with _shared_lock:
+        obj = _shared_tiers.get(name)
+        if obj is None:
+            obj = _shared_tiers[name] = factory()
+        return obj
+
+
+def shared_lru(name, max_size=1024, ttl=None):
+    """Return the process-wide LRU tier registered under name."""
+    return shared(name, lambda: LRUCache(max_size, ttl))
+
+
+class LazyShared:
+    """Stand-in for shared(name, factory) that defers the factory to first attribute access.
+
+    Lets a module declare its process-wide objects at import time without
+    opening files or connections until something actually uses them.
+    """
+
+    __slots__ = ("_shared_name", "_factory", "_obj")
+
+    def __init__(self, name, factory):
+        self._shared_name = name
+        self._factory = factory
+        self._obj = None
+
+    def resolve(self):
+        """Return the underlying object, creating it on first call."""
+        if self._obj is None:
+            self._obj = shared(self._shared_name, self._factory)
+        return self._obj
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and get the same result or exception. Nothing is
+    kept once the call finishes, so this is not a cache.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args):
+        """Return func(*args), sharing the call with any concurrent caller for key."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats["issued"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class PersistentCache:
+    """Two-tier cache of values per normalized location: an in-process LRU over a SQLite table.
+
+    Lookups probe the LRU first, then `table` (a primary key lookup), and
+    only then fall through to the caller's fetch. Writes to the table are
+    queued on the database's writer thread and not waited for. Concurrent
+    misses for the same location share one fetch, and failures (None or an
+    exception) are never cached. The table is trimmed to max_rows,
+    soonest-expiring first.
+
+    Subclasses set `table`, its value `columns` and the name of the shared
+    LRU tier, and override to_row()/from_row() when a value is not already a
+    tuple of those columns. The table itself is created in migrations.py.
+    """
+
+    table = None
+    columns = ()
+    tier = None
+
+    def __init__(self, db, max_size, ttl, max_rows):
+        self.db = db
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.memory = shared_lru(self.tier, max_size, ttl)
+        self.stats = self.memory.stats
+        self.flight = SingleFlight()
+
+    def to_row(self, value):
+        """Return the `columns` values that store value."""
+        return tuple(value)
+
+    def from_row(self, row):
+        """Return the value stored as the `columns` values in row."""
+        return tuple(row)
+
+    def get(self, location):
+        """Return the cached value for location, or None on a miss."""
+        key = normalize_location(location)
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        row = self.db.read_one(
+            f"SELECT {', '.join(self.columns)}, expires_at FROM {self.table} WHERE key = ?", (key,)
+        )
+        if row and row[-1] > time.time():
+            value = self.from_row(row[:-1])
+            self.memory.set(key, value, ttl=row[-1] - time.time())
+            self.stats["db_hits"] += 1
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def get_or_fetch(self, location, fetch):
+        """Return the cached value for location, or fetch(location) it and cache the result."""
+        value = self.get(location)
+        if value is not None:
+            return value
+        return self.flight.do(normalize_location(location), self._fetch, location, fetch)
+
+    def _fetch(self, location, fetch):
+        # A caller may have finished the same lookup just before this one started
+        value = self.memory.get(normalize_location(location))
+        if value is None:
+            value = fetch(location)
+            if value is not None:
+                self.set(location, value)
+        return value
+
+    def set(self, location, value):
+        """Store value for location in both tiers."""
+        key = normalize_location(location)
+        self.memory.set(key, value, ttl=self.ttl)
+        self.db.submit(lambda conn: conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, {', '.join(self.columns)}, expires_at) "
+            f"VALUES (?, {', '.join('?' * len(self.columns))}, ?)",
+            (key, *self.to_row(value), time.time() + self.ttl)
+        ))
+        self.stats["writes"] += 1
+        if self.stats["writes"] % 100 == 0:
+            self.db.submit(self._prune)
+
+    def _prune(self, conn):
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+        conn.execute(f'''
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_rows,))
+
+    def prune(self):
+        """Drop expired rows and trim the table to max_rows, soonest-expiring first."""
+        self.db.write(self._prune)
+
+    def is_empty(self):
+        return self.db.read_one(f"SELECT 1 FROM {self.table} LIMIT 1") is None
+
+    def clear(self):
+        self.memory.clear()
+        self.db.execute(f"DELETE FROM {self.table}")
+
+
+class GeocodeCache(PersistentCache):
+    """Two-tier cache mapping normalized locations to (lat, lng), in the `geocode_cache` table."""
+
+    table = "geocode_cache"
+    columns = ("latitude", "longitude")
+    tier = "geocode"
+
+    def __init__(self, db, max_size=1024, ttl=30 * 24 * 3600, max_rows=100_000):
+        super().__init__(db, max_size, ttl, max_rows)
+
+    def warm_from_requests(self):
+        """Seed the persistent tier from coordinates already stored in weather_requests."""
+        rows = self.db.read('''
+            SELECT location, latitude, longitude FROM weather_requests
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            GROUP BY location
+        ''')
+        expires_at = time.time() + self.ttl
+        self.db.write(lambda conn: conn.executemany(
+            "INSERT OR IGNORE INTO geocode_cache (key, latitude, longitude, expires_at) VALUES (?, ?, ?, ?)",
+            [(normalize_location(loc), lat, lng, expires_at) for loc, lat, lng in rows]
+        ))
+        return len(rows)
+
+
+class VideoCache(PersistentCache):
+    """Two-tier cache of video search results per normalized location, in the `video_cache` table.
+
+    Results are stored as JSON. fetch should return None on failure.
+    """
+
+    table = "video_cache"
+    columns = ("videos",)
+    tier = "videos"
+
+    def __init__(self, db, max_size=256, ttl=7 * 24 * 3600, max_rows=5000):
+        super().__init__(db, max_size, ttl, max_rows)
+
+    def to_row(self, videos):
+        return (json.dumps(videos),)
+
+    def from_row(self, row):
+        return json.loads(row[0])
+
+    def expiring(self, locations, within):
+        """Return the locations whose entry is missing or expires in the next `within` seconds."""
+        keys = {normalize_location(location): location for location in locations}
+        if not keys:
+            return []
+        fresh = {key for (key,) in self.db.read(
+            f"SELECT key FROM video_cache WHERE expires_at > ? AND key IN ({', '.join('?' * len(keys))})",
+            (time.time() + within, *keys)
+        )}
+        return [location for key, location in keys.items() if key not in fresh]
+
+
+class WeatherCache:
+    """Short-lived cache of current-weather responses keyed on a coordinate grid.
+
+    Coordinates are snapped to cells of `grid` degrees, so repeat queries and
+    nearby locations share one entry. Entries are fresh for `ttl` seconds; for
+    a further `stale_ttl` seconds they are still served while a background
+    thread refreshes them (stale-while-revalidate) at background rate-limit
+    priority. Concurrent misses for a cell share one fetch.
+    """
+
+    def __init__(self, grid=0.01, ttl=600, stale_ttl=1800, max_size=2048):
+        self.grid = grid
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.memory = LRUCache(max_size, ttl + stale_ttl)
+        self.stats = self.memory.stats
+        self.flight = SingleFlight()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def cell(self, lat, lng):
+        """Return the grid cell containing (lat, lng)."""
+        return round(lat / self.grid), round(lng / self.grid)
+
+    def get_or_fetch(self, lat, lng, fetch, force_refresh=False):
+        """Return fetch(lat, lng) for the cell containing (lat, lng), cached.
+
+        fetch should return None on failure; failures are never cached.
+        Pass force_refresh=True to bypass the cache and overwrite the entry.
+        """
+        key = self.cell(lat, lng)
+        if not force_refresh:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, fetched_at = entry
+                if time.time() - fetched_at < self.ttl:
+                    self.stats["hits"] += 1
+                else:
+                    self.stats["stale_hits"] += 1
+                    self._refresh_in_background(key, lat, lng, fetch)
+                return value
+
+        self.stats["misses"] += 1
+        return self.flight.do(key, self._fetch, key, lat, lng, fetch, not force_refresh)
+
+    def _fetch(self, key, lat, lng, fetch, reuse_fresh=False):
+        if reuse_fresh:
+            # A caller may have finished the same fetch just before this one started
+            entry = self.memory.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                return entry[0]
+        value = fetch(lat, lng)
+        if value is not None:
+            self.memory.set(key, (value, time.time()))
+        return value
+
+    def _refresh_in_background(self, key, lat, lng, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            # A new thread starts with the default (interactive) priority;
+            # nobody is waiting on this call, so queue it behind those who are.
+            try:
+                with priority(BACKGROUND):
+                    self.flight.do(key, self._fetch, key, lat, lng, fetch)
+                self.stats["refreshes"] += 1
+            except Exception as e:
+                print(f"Background weather refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, lat, lng):
+        self.memory.pop(self.cell(lat, lng))
+
+    def clear(self):
+        self.memory.clear()
+
+
+class ForecastCache:
+    """Forecast responses keyed on (grid cell, issue time).
+
+    Upstream forecasts are reissued every `issue_interval` seconds, so every
+    lookup for a cell within one issue period shares one response however
+    many users or overlapping date windows ask for it. Concurrent misses for
+    a key share one fetch.
+    """
+
+    def __init__(self, grid=0.1, issue_interval=3 * 3600, max_size=1024):
+        self.grid = grid
+        self.issue_interval = issue_interval
+        self.memory = LRUCache(max_size, issue_interval)
+        self.stats = self.memory.stats
+        self.flight = SingleFlight()
+
+    def issue_time(self, now=None):
+        """Return the start of the issue period containing now (Unix seconds)."""
+        now = time.time() if now is None else now
+        return int(now - now % self.issue_interval)
+
+    def get_or_fetch(self, lat, lng, fetch, now=None):
+        """Return fetch(lat, lng) for the cell and current issue period, cached.
+
+        fetch should return None on failure; failures are never cached.
+        """
+        key = (round(lat / self.grid), round(lng / self.grid), self.issue_time(now))
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+        self.stats["misses"] += 1
+        return self.flight.do(key, self._fetch, key, lat, lng, fetch)
+
+    def _fetch(self, key, lat, lng, fetch):
+        value = self.memory.get(key)
+        if value is None:
+            value = fetch(lat, lng)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def clear(self):
+        self.memory.clear()
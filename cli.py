@@ -0,0 +1,175 @@
+"""Command-line access to the weather request store, without the Streamlit UI.
+
+Usage:
+    python cli.py list [--search TEXT] [--sort newest] [--limit 20]
+    python cli.py get ID
+    python cli.py create LOCATION START_DATE END_DATE
+    python cli.py update [ID ...] [FILTERS] [--temperature T] [--description TEXT]
+    python cli.py delete [ID ...] [FILTERS]
+    python cli.py weather LOCATION [LOCATION ...]
+    python cli.py export [--format csv] [--gzip] [--output FILE]
+    python cli.py serve [--host 127.0.0.1] [--port 8080]
+
+FILTERS select requests for update and delete in bulk: --location NAME
+(repeatable), --from/--to YYYY-MM-DD (start date) and --min-temp/--max-temp.
+Records are printed as one JSON object per line. `serve` starts the HTTP
+API in service.py.
+"""
+import argparse
+import json
+import sys
+
+import core
+from export import export_filename, export_rows, iter_chunks
+from service import SORTS, WeatherService
+
+
+def _print_record(row):
+    print(json.dumps(dict(zip(core.REQUEST_FIELDS, row))))
+
+
+def cmd_list(args):
+    cursor, remaining = None, args.limit
+    while remaining > 0:
+        rows, cursor = core.fetch_weather_requests_page(SORTS[args.sort], min(remaining, 1000), cursor, args.search)
+        for row in rows:
+            _print_record(row)
+        remaining -= len(rows)
+        if cursor is None:
+            break
+    return 0
+
+
+def cmd_get(args):
+    row = core.read_weather_request(args.id)
+    if row is None:
+        print(f"Weather request {args.id} not found.", file=sys.stderr)
+        return 1
+    _print_record(row)
+    return 0
+
+
+def cmd_create(args):
+    request_id = core.create_weather_request(args.location, args.start_date, args.end_date)
+    if not request_id:
+        return 1
+    _print_record(core.read_weather_request(request_id))
+    return 0
+
+
+def _targets(args):
+    """Bulk-operation keyword arguments from the ids and filter options."""
+    targets = {"record_ids": args.ids or None, "locations": args.location, "date_from": args.date_from,
+               "date_to": args.date_to, "temp_min": args.min_temp, "temp_max": args.max_temp}
+    return {name: value for name, value in targets.items() if value is not None}
+
+
+def cmd_update(args):
+    if args.temperature is None and args.description is None:
+        print("Give --temperature and/or --description.", file=sys.stderr)
+        return 2
+    targets = _targets(args)
+    if list(targets) == ["record_ids"] and len(args.ids) == 1:
+        return 0 if core.update_weather_request(args.ids[0], args.temperature, args.description) else 1
+    return 0 if core.update_weather_requests(new_temp=args.temperature, new_desc=args.description, **targets) else 1
+
+
+def cmd_delete(args):
+    targets = _targets(args)
+    if list(targets) == ["record_ids"] and len(args.ids) == 1:
+        return 0 if core.delete_weather_request(args.ids[0]) else 1
+    return 0 if core.delete_weather_requests(**targets) else 1
+
+
+def _add_filter_arguments(command):
+    command.add_argument("ids", type=int, nargs="*")
+    command.add_argument("--location", action="append", help="location to match (repeatable)")
+    command.add_argument("--from", dest="date_from", help="earliest start date, YYYY-MM-DD")
+    command.add_argument("--to", dest="date_to", help="latest start date, YYYY-MM-DD")
+    command.add_argument("--min-temp", type=float)
+    command.add_argument("--max-temp", type=float)
+
+
+def cmd_weather(args):
+    for location, (temp, desc, lat, lng) in core.get_current_weather_batch(args.locations).items():
+        print(json.dumps({"location": location, "temperature": temp, "weather_desc": desc,
+                          "latitude": lat, "longitude": lng}))
+    return 0
+
+
+def cmd_export(args):
+    compress = args.gzip and args.format != "parquet"
+    output = args.output or export_filename("weather_data_export", args.format, compress)
+    with open(output, "wb") as out:
+        count = core.db.run(lambda conn: export_rows(
+            iter_chunks(conn, f"SELECT {core.REQUEST_COLUMNS} FROM weather_requests ORDER BY id"),
+            core.EXPORT_COLUMNS, args.format, out, compress
+        ), op="export")
+    print(f"Exported {count} records to {output}.", file=sys.stderr)
+    return 0
+
+
+def cmd_serve(args):
+    import asyncio
+
+    try:
+        asyncio.run(WeatherService(args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage weather requests from the command line.")
+    parser.add_argument("--db", default=core.DB_PATH, help=f"database path (default: {core.DB_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("list", help="print requests, newest first by default")
+    command.add_argument("--search", default="")
+    command.add_argument("--sort", choices=list(SORTS), default="newest")
+    command.add_argument("--limit", type=int, default=20)
+    command.set_defaults(func=cmd_list)
+
+    command = commands.add_parser("get", help="print one request")
+    command.add_argument("id", type=int)
+    command.set_defaults(func=cmd_get)
+
+    command = commands.add_parser("create", help="fetch current weather and store a request")
+    command.add_argument("location")
+    command.add_argument("start_date", help="YYYY-MM-DD")
+    command.add_argument("end_date", help="YYYY-MM-DD")
+    command.set_defaults(func=cmd_create)
+
+    command = commands.add_parser("update", help="change the temperature or description of requests")
+    _add_filter_arguments(command)
+    command.add_argument("--temperature", type=float)
+    command.add_argument("--description")
+    command.set_defaults(func=cmd_update)
+
+    command = commands.add_parser("delete", help="delete requests by id or filter")
+    _add_filter_arguments(command)
+    command.set_defaults(func=cmd_delete)
+
+    command = commands.add_parser("weather", help="print current weather for locations")
+    command.add_argument("locations", nargs="+")
+    command.set_defaults(func=cmd_weather)
+
+    command = commands.add_parser("export", help="write every request to a file")
+    command.add_argument("--format", choices=["csv", "json", "ndjson", "parquet"], default="csv")
+    command.add_argument("--gzip", action="store_true")
+    command.add_argument("--output", help="file name (default: weather_data_export.<format>)")
+    command.set_defaults(func=cmd_export)
+
+    command = commands.add_parser("serve", help="run the HTTP API (see service.py)")
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=8080)
+    command.add_argument("--workers", type=int, default=32)
+    command.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args()
+    core.DB_PATH = args.db
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,764 @@
+"""Weather Explorer core: configuration, API clients, data access and export.
+
+Everything app.py needs except the Streamlit UI, so CLI tools (ingest.py,
+scheduler.py) and scripts can use it without loading streamlit or pandas.
+Importing this module is cheap: the database, API clients and caches are
+LazyShared proxies created on first use, and `requests` is only imported
+when the first API client is built.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import analysis
+import metrics
+import observations
+from aggregates import get_quick_stats
+from cache import ForecastCache, GeocodeCache, LazyShared, LRUCache, VideoCache, WeatherCache, normalize_location, shared
+from db import Database
+from export import export_rows, iter_chunks
+from ratelimit import BACKGROUND, RateLimiter, RateLimitExceeded, priority
+from scheduler import RefreshScheduler
+from spatial import LocationIndex, parse_coordinates, within_radius
+
+# API Keys (replace with your own)
+OPENWEATHER_API_KEY = ""
+GOOGLE_MAPS_API_KEY = ""
+YOUTUBE_API_KEY = ""
+
+# API endpoints (override with environment variables, e.g. to point at a local stub server)
+GOOGLE_MAPS_BASE_URL = os.environ.get("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api")
+OPENWEATHER_BASE_URL = os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
+YOUTUBE_BASE_URL = os.environ.get("YOUTUBE_BASE_URL", "https://www.googleapis.com/youtube/v3")
+
+# HTTP client settings per provider: (connect timeout, read timeout) in seconds and retry count
+HTTP_SETTINGS = {
+    "geocoding": {"connect_timeout": 3.05, "read_timeout": 5, "retries": 2},
+    "openweather": {"connect_timeout": 3.05, "read_timeout": 5, "retries": 2},
+    "youtube": {"connect_timeout": 3.05, "read_timeout": 10, "retries": 1},
+}
+
+# Client-side budgets per provider: calls per second (burst allowed) and units per day.
+# A YouTube search costs 100 of the 10,000 daily quota units.
+RATE_LIMITS = {
+    "geocoding": {"per_second": 50, "burst": 50, "per_day": 20000},
+    "openweather": {"per_second": 1, "burst": 10, "per_day": 30000},
+    "youtube": {"per_second": 2, "burst": 5, "per_day": 10000},
+}
+YOUTUBE_SEARCH_COST = 100
+
+# Geocode cache settings
+GEOCODE_CACHE_SIZE = 1024  # entries kept in memory
+GEOCODE_CACHE_ROWS = 100000  # entries kept in SQLite
+GEOCODE_CACHE_TTL = 30 * 24 * 3600  # seconds
+
+# Current-weather cache settings
+WEATHER_CACHE_GRID = 0.01  # degrees; coordinates in the same cell share an entry
+WEATHER_CACHE_TTL = 600  # seconds an entry is fresh
+WEATHER_CACHE_STALE_TTL = 1800  # further seconds a stale entry is served while refreshing
+WEATHER_CACHE_SIZE = 2048
+
+# Forecast cache settings: OpenWeather reissues its 5 day / 3 hour forecast every 3 hours
+FORECAST_CACHE_GRID = 0.1  # degrees
+FORECAST_ISSUE_INTERVAL = 3 * 3600  # seconds
+FORECAST_CACHE_SIZE = 1024
+
+# YouTube results cache; the most requested locations are prefetched in the background
+VIDEO_CACHE_SIZE = 256  # entries kept in memory
+VIDEO_CACHE_ROWS = 5000  # entries kept in SQLite
+VIDEO_CACHE_TTL = 7 * 24 * 3600  # seconds
+VIDEO_PREFETCH_TOP_N = 10
+VIDEO_PREFETCH_INTERVAL = 6 * 3600  # seconds between prefetch passes
+VIDEO_PREFETCH_IN_BACKGROUND = True  # prefetch from the app process; only runs when YOUTUBE_API_KEY is set
+
+# Nearest-location index (spatial.py) is rebuilt at most this often, in seconds
+LOCATION_INDEX_MAX_AGE = 60
+
+# Maximum locations fetched at once by get_current_weather_many()
+BATCH_CONCURRENCY = 16
+
+# Background refresh of active requests (see scheduler.py); can also run as `python scheduler.py`
+REFRESH_IN_BACKGROUND = False
+REFRESH_INTERVAL = 900  # seconds between passes
+REFRESH_CALLS_PER_MINUTE = 60
+
+# Port for a Prometheus /metrics endpoint in the Streamlit process (None: off); see metrics.py
+METRICS_PORT = int(os.environ["METRICS_PORT"]) if os.environ.get("METRICS_PORT") else None
+
+# Database setup: schema is created/upgraded by migrations.py; reads use a
+# per-thread connection (db.read/read_one/run) and writes go through db's single writer thread.
+# Nothing is opened until first use, so DB_PATH can still be changed after import.
+DB_PATH = "weather_app.db"
+db = LazyShared("db", lambda: Database(DB_PATH))
+
+# Pooled, rate-limited API clients, shared by every session and rerun; daily usage is kept in api_quota
+def _create_api_client(name, base_url):
+    from http_client import ApiClient  # loads requests, so only when a client is first used
+    limiter = RateLimiter(name, db=db, **RATE_LIMITS[name])
+    return ApiClient(name, base_url, limiter=limiter, **HTTP_SETTINGS[name])
+
+geocoding_api = LazyShared("http:geocoding", lambda: _create_api_client("geocoding", GOOGLE_MAPS_BASE_URL))
+openweather_api = LazyShared("http:openweather", lambda: _create_api_client("openweather", OPENWEATHER_BASE_URL))
+youtube_api = LazyShared("http:youtube", lambda: _create_api_client("youtube", YOUTUBE_BASE_URL))
+
+# Columns of a weather request row, in display order. Spelled out rather than
+# SELECT * so that columns added by migrations (e.g. location_key) stay internal.
+REQUEST_COLUMNS = "id, location, latitude, longitude, start_date, end_date, temperature, weather_desc, request_time"
+REQUEST_FIELDS = [column.strip() for column in REQUEST_COLUMNS.split(",")]
+
+# Header row of every export (app, CLI, HTTP API), one per REQUEST_COLUMNS column
+EXPORT_COLUMNS = ["ID", "Location", "Latitude", "Longitude", "Start Date", "End Date", "Temperature",
+                  "Weather Description", "Request Time"]
+
+INSERT_REQUEST_SQL = '''
+    INSERT INTO weather_requests (location, latitude, longitude, start_date, end_date, temperature, weather_desc, request_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# View Requests sort orders: (column, direction). Ties are broken by id so
+# every order is total and can be paged with a (column, id) keyset.
+SORT_ORDERS = {
+    "Newest First": ("request_time", "DESC"),
+    "Oldest First": ("request_time", "ASC"),
+    "Temperature (High to Low)": ("temperature", "DESC"),
+    "Temperature (Low to High)": ("temperature", "ASC"),
+}
+
+def _create_geocode_cache():
+    geocode_cache = GeocodeCache(db, max_size=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL, max_rows=GEOCODE_CACHE_ROWS)
+    if geocode_cache.is_empty():
+        geocode_cache.warm_from_requests()
+    return geocode_cache
+
+geocode_cache = LazyShared("geocode_cache", _create_geocode_cache)
+
+video_cache = LazyShared("video_cache", lambda: VideoCache(
+    db, max_size=VIDEO_CACHE_SIZE, ttl=VIDEO_CACHE_TTL, max_rows=VIDEO_CACHE_ROWS
+))
+location_index = LazyShared("location_index", lambda: LocationIndex(db, max_age=LOCATION_INDEX_MAX_AGE))
+request_counts = LazyShared("request_counts", lambda: LRUCache(max_size=256))
+
+weather_cache = LazyShared("weather", lambda: WeatherCache(
+    grid=WEATHER_CACHE_GRID,
+    ttl=WEATHER_CACHE_TTL,
+    stale_ttl=WEATHER_CACHE_STALE_TTL,
+    max_size=WEATHER_CACHE_SIZE
+))
+forecast_cache = LazyShared("forecast", lambda: ForecastCache(
+    grid=FORECAST_CACHE_GRID,
+    issue_interval=FORECAST_ISSUE_INTERVAL,
+    max_size=FORECAST_CACHE_SIZE
+))
+
+# Original functions (unchanged)
+def geocode(location):
+    """Look up coordinates with the Google Maps Geocoding API, bypassing the cache."""
+    response = geocoding_api.get_json("geocode/json", {"address": location, "key": GOOGLE_MAPS_API_KEY})
+    
+    if response["status"] == "OK":
+        lat = response["results"][0]["geometry"]["location"]["lat"]
+        lng = response["results"][0]["geometry"]["location"]["lng"]
+        return lat, lng
+    elif response["status"] == "OVER_QUERY_LIMIT":
+        geocoding_api.limiter.penalize(2)
+        raise RateLimitExceeded("geocoding", "provider reported OVER_QUERY_LIMIT")
+    else:
+        raise ValueError("Invalid location or unable to geocode.")
+
+@metrics.timed("weather_core_calls", function="get_coordinates")
+def get_coordinates(location):
+    """Validate location and get coordinates using Google Maps Geocoding API.
+
+    Input that is already a coordinate pair ("51.5,-0.12") is returned as-is.
+    """
+    coords = parse_coordinates(location)
+    if coords is not None:
+        return coords
+    return geocode_cache.get_or_fetch(location, geocode)
+
+def label_coordinates(location, lat, lng):
+    """Name typed coordinates after the closest saved location, e.g. "51.5,-0.12 (near London)".
+
+    Place names are returned unchanged; the lookup is offline (LocationIndex).
+    """
+    if parse_coordinates(location) is None:
+        return location
+    place = location_index.reverse_geocode(lat, lng)
+    return f"{location} (near {place})" if place else location
+
+def requests_near(lat, lng, radius_km, limit=100):
+    """Return [(distance km, id, location, lat, lng), ...] for requests within radius_km, closest first."""
+    return db.run(within_radius, lat, lng, radius_km, limit)
+
+def fetch_weather(lat, lng):
+    """Fetch current (temperature, description) at coordinates from OpenWeather, or None."""
+    response = openweather_api.get_json(
+        "weather", {"lat": lat, "lon": lng, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+    )
+    
+    if response["cod"] == 200:
+        return response["main"]["temp"], response["weather"][0]["description"]
+    return None
+
+def fetch_cached_weather(lat, lng):
+    """Return (temperature, description) at coordinates through the weather cache, or None."""
+    return weather_cache.get_or_fetch(lat, lng, fetch_weather)
+
+def fetch_forecast(lat, lng):
+    """Fetch the daily forecast at coordinates from OpenWeather, or None.
+
+    The 3-hourly entries are grouped by local date into
+    {"YYYY-MM-DD": (min, max, mean, most common description)}.
+    """
+    response = openweather_api.get_json(
+        "forecast", {"lat": lat, "lon": lng, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+    )
+    if str(response.get("cod")) != "200":
+        return None
+    offset = timedelta(seconds=response.get("city", {}).get("timezone", 0))
+    temps, descs = {}, {}
+    for entry in response["list"]:
+        day = (datetime.fromtimestamp(entry["dt"], timezone.utc) + offset).date().isoformat()
+        temps.setdefault(day, []).append(entry["main"]["temp"])
+        descs.setdefault(day, Counter())[entry["weather"][0]["description"]] += 1
+    return {
+        day: (min(values), max(values), sum(values) / len(values), descs[day].most_common(1)[0][0])
+        for day, values in temps.items()
+    }
+
+@metrics.timed("weather_core_calls", function="get_forecast_range")
+def get_forecast_range(lat, lng, start_date, end_date):
+    """Return [(day, min, max, mean, description), ...] for forecast days between start_date and end_date.
+
+    Days past the forecast horizon are left out; returns None if the forecast
+    could not be fetched. Forecasts are cached per grid cell and issue time.
+    """
+    try:
+        days = forecast_cache.get_or_fetch(lat, lng, fetch_forecast)
+    except Exception as e:
+        print(f"Error fetching forecast: {e}")
+        metrics.error("get_forecast_range", type(e).__name__)
+        return None
+    if days is None:
+        return None
+    return [(day, *days[day]) for day in sorted(days) if start_date <= day <= end_date]
+
+@metrics.timed("weather_core_calls", function="get_current_weather")
+def get_current_weather(location, force_refresh=False):
+    """Fetch current weather for a given location.
+
+    Responses are cached per coordinate grid cell; pass force_refresh=True to bypass the cache.
+    """
+    try:
+        lat, lng = get_coordinates(location)
+        result = weather_cache.get_or_fetch(lat, lng, fetch_weather, force_refresh=force_refresh)
+        
+        if result is not None:
+            temp, desc = result
+            print(f"Current Weather in {location}: {temp}°C, {desc}")
+            return temp, desc, lat, lng
+        else:
+            print("Error fetching weather data.")
+            metrics.error("get_current_weather", "no_data")
+            return None, None, None, None
+    except Exception as e:
+        print(f"Error: {e}")
+        metrics.error("get_current_weather", type(e).__name__)
+        return None, None, None, None
+
+def split_locations(text):
+    """Split user input holding several locations separated by ';' or newlines."""
+    return [loc.strip() for loc in text.replace("\n", ";").split(";") if loc.strip()]
+
+async def get_current_weather_many(locations, concurrency=BATCH_CONCURRENCY, force_refresh=False):
+    """Fetch current weather for many locations concurrently.
+
+    Locations are deduplicated on their normalized form, then each one is
+    geocoded and its weather fetched, with at most `concurrency` locations in
+    flight. Yields (location, (temp, desc, lat, lng)) pairs in completion
+    order; failed locations yield (location, (None, None, None, None)).
+    """
+    unique = {}
+    for location in locations:
+        unique.setdefault(normalize_location(location), location)
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(location):
+        # Cache lookups are fast and stay on the loop thread; only the
+        # blocking HTTP calls run in the executor.
+        async with semaphore:
+            try:
+                coords = parse_coordinates(location) or geocode_cache.get(location)
+                if coords is None:
+                    coords = await loop.run_in_executor(
+                        executor, contextvars.copy_context().run, geocode_cache.get_or_fetch, location, geocode
+                    )
+                # copy_context() carries the caller's ratelimit priority into the worker thread
+                result = await loop.run_in_executor(
+                    executor, contextvars.copy_context().run,
+                    weather_cache.get_or_fetch, *coords, fetch_weather, force_refresh
+                )
+            except Exception as e:
+                print(f"Error fetching weather for {location}: {e}")
+                metrics.error("get_current_weather_many", type(e).__name__)
+                result = None
+            if result is None:
+                return location, (None, None, None, None)
+            return location, (result[0], result[1], coords[0], coords[1])
+
+    try:
+        for task in asyncio.as_completed([fetch_one(location) for location in unique.values()]):
+            yield await task
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_current_weather_batch(locations, concurrency=BATCH_CONCURRENCY, force_refresh=False):
+    """Blocking wrapper around get_current_weather_many(); returns {location: (temp, desc, lat, lng)}."""
+    async def collect():
+        return {location: result async for location, result in
+                get_current_weather_many(locations, concurrency, force_refresh)}
+    return asyncio.run(collect())
+
+def validate_date(date_str):
+    """Validate date format (YYYY-MM-DD)."""
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+def validate_date_range(start_date, end_date):
+    """Validate a YYYY-MM-DD start/end pair, printing the reason when invalid."""
+    if not validate_date(start_date) or not validate_date(end_date):
+        print("Invalid date format. Use YYYY-MM-DD.")
+        metrics.error("validate_date_range", "invalid_format")
+        return False
+    
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    if start > end:
+        print("Start date must be before end date.")
+        metrics.error("validate_date_range", "start_after_end")
+        return False
+    return True
+
+def save_requests(conn, rows, forecasts=None):
+    """Insert INSERT_REQUEST_SQL rows on a writable connection and add their readings to the observation history.
+
+    forecasts optionally holds, per row, the get_forecast_range() days to store with it;
+    those rows are inserted one at a time and their new ids are returned.
+    """
+    request_ids = None
+    if forecasts is None:
+        conn.executemany(INSERT_REQUEST_SQL, rows)
+    else:
+        request_ids = []
+        issued_at = datetime.fromtimestamp(forecast_cache.issue_time()).isoformat()
+        for row, days in zip(rows, forecasts):
+            request_id = conn.execute(INSERT_REQUEST_SQL, row).lastrowid
+            conn.executemany(
+                "INSERT INTO request_forecasts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(request_id, *day, issued_at) for day in days or []]
+            )
+            request_ids.append(request_id)
+    observations.record(conn, [(row[0], row[7], row[5], row[6]) for row in rows])
+    return request_ids
+
+@metrics.timed("weather_core_calls", function="create_weather_request")
+def create_weather_request(location, start_date, end_date):
+    """Store weather request in the database. Returns the new request's id, or False."""
+    if not validate_date_range(start_date, end_date):
+        return False
+    
+    temp, desc, lat, lng = get_current_weather(location)
+    if temp is not None:
+        forecast = get_forecast_range(lat, lng, start_date, end_date)
+        request_ids = db.write(save_requests, [(location, lat, lng, start_date, end_date, temp, desc, datetime.now().isoformat())], [forecast])
+        print("Weather data saved successfully.")
+        return request_ids[0]
+    return False
+
+@metrics.timed("weather_core_calls", function="create_weather_requests")
+def create_weather_requests(locations, start_date, end_date):
+    """Store weather requests for several locations, fetching their weather concurrently.
+
+    Returns (saved locations, failed locations).
+    """
+    if not validate_date_range(start_date, end_date):
+        return [], list(locations)
+    
+    results = get_current_weather_batch(locations)
+    request_time = datetime.now().isoformat()
+    saved = [loc for loc, (temp, desc, lat, lng) in results.items() if temp is not None]
+    failed = [loc for loc in results if loc not in saved]
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as executor:
+        forecasts = list(executor.map(
+            lambda loc: get_forecast_range(results[loc][2], results[loc][3], start_date, end_date), saved
+        ))
+    db.write(save_requests, [
+        (loc, results[loc][2], results[loc][3], start_date, end_date, results[loc][0], results[loc][1], request_time)
+        for loc in saved
+    ], forecasts)
+    print(f"Saved weather data for {len(saved)} of {len(results)} locations.")
+    return saved, failed
+
+def read_weather_requests():
+    """Read all weather requests from the database."""
+    rows = db.read(f"SELECT {REQUEST_COLUMNS} FROM weather_requests")
+    return rows
+
+def read_weather_request(record_id):
+    """Read one weather request by id, or None."""
+    return db.read_one(f"SELECT {REQUEST_COLUMNS} FROM weather_requests WHERE id = ?", (int(record_id),))
+
+def location_search_clause(search):
+    """Return a (WHERE clause, params) pair matching rows whose location contains search.
+
+    The match is case-insensitive. Searches of 3+ characters are a phrase
+    query on the trigram index in weather_requests_fts, which needs at
+    least one trigram; shorter ones scan the distinct names in
+    location_counts and look the matches up on the location_key index.
+    """
+    search = search.strip()
+    if len(search) >= 3:
+        phrase = '"' + search.replace('"', '""') + '"'
+        return "id IN (SELECT rowid FROM weather_requests_fts WHERE location MATCH ?)", [phrase]
+    pattern = "%" + search.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return ("location_key IN (SELECT lower(trim(location)) FROM location_counts "
+            "WHERE lower(location) LIKE ? ESCAPE '\\')"), [pattern]
+
+def suggest_locations(prefix, limit=8):
+    """Return up to limit stored locations starting with prefix (case-insensitive), for autocomplete."""
+    key = prefix.strip().lower()
+    if not key:
+        return []
+    rows = db.read('''
+        SELECT location FROM weather_requests
+        WHERE location_key >= ? AND location_key < ?
+        GROUP BY location_key ORDER BY location_key LIMIT ?
+    ''', (key, key + "\uffff", limit))
+    return [row[0] for row in rows]
+
+def get_data_version():
+    """Return a counter that changes whenever weather_requests is written."""
+    return db.read_one("SELECT version FROM table_versions WHERE name = 'weather_requests'")[0]
+
+@metrics.timed("weather_core_calls", function="count_weather_requests")
+def count_weather_requests(search=""):
+    """Count requests matching search, reusing the last count until the table changes."""
+    if not search.strip():
+        return db.run(get_quick_stats)[0]
+    key = (search.strip().lower(), get_data_version())
+    total = request_counts.get(key)
+    if total is None:
+        clause, params = location_search_clause(search)
+        total = db.read_one(f"SELECT COUNT(*) FROM weather_requests WHERE {clause}", params)[0]
+        request_counts.set(key, total)
+    return total
+
+@metrics.timed("weather_core_calls", function="fetch_weather_requests_page")
+def fetch_weather_requests_page(sort_by="Newest First", page_size=20, after=None, search=""):
+    """Fetch one page of requests in a SORT_ORDERS order, using keyset pagination.
+
+    after is the cursor returned with the previous page (None for the first
+    page). Each page is an index range scan from the cursor, so page N costs
+    the same as page 1. Returns (rows, cursor for the next page or None).
+    """
+    column, direction = SORT_ORDERS[sort_by]
+    comparison = "<" if direction == "DESC" else ">"
+    conditions, params = [], []
+    
+    if search.strip():
+        clause, params = location_search_clause(search)
+        conditions.append(clause)
+
+    # SQLite sorts NULLs first ascending and last descending, and a row-value
+    # comparison with NULL is never true, so the NULL and non-NULL runs of the
+    # sort column are paged as two ranges, in sort order.
+    nulls, values = (f"{column} IS NULL", []), (f"{column} IS NOT NULL", [])
+    if after is not None:
+        value, last_id = after
+        if value is None:
+            nulls = (f"{column} IS NULL AND id {comparison} ?", [last_id])
+        else:
+            values = (f"({column}, id) {comparison} (?, ?)", [value, last_id])
+    ranges = [nulls, values] if direction == "ASC" else [values, nulls]
+    if after is not None and (after[0] is None) == (direction == "DESC"):
+        ranges = ranges[1:]  # the cursor is already past the first range
+
+    rows = []
+    for condition, range_params in ranges:
+        query = f"SELECT {REQUEST_COLUMNS} FROM weather_requests WHERE " + " AND ".join(conditions + [condition])
+        query += f" ORDER BY {column} {direction}, id {direction} LIMIT ?"
+        rows += db.read(query, params + range_params + [page_size + 1 - len(rows)])
+        if len(rows) > page_size:
+            break
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    sort_value = last[8] if column == "request_time" else last[6]
+    return rows, (sort_value, last[0])
+
+def list_locations():
+    """Return every stored location name, alphabetically (from the location_counts summary table)."""
+    return [row[0] for row in db.read("SELECT location FROM location_counts ORDER BY location")]
+
+def request_filter_clause(record_ids=None, locations=None, date_from=None, date_to=None, temp_min=None, temp_max=None):
+    """Return a (WHERE clause, params) pair matching requests that meet every given condition.
+
+    record_ids and locations are lists; locations match case-insensitively
+    on the location_key index. Each list is passed as one JSON parameter, so
+    its length is not limited by SQLite's variable count. date_from/date_to
+    bound start_date and temp_min/temp_max bound temperature, inclusively.
+    Conditions left as None are ignored. Raises ValueError on an invalid
+    value or when no condition is given.
+    """
+    conditions, params = [], []
+    if record_ids is not None:
+        conditions.append("id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps([int(record_id) for record_id in record_ids]))
+    if locations is not None:
+        conditions.append("location_key IN (SELECT lower(trim(value)) FROM json_each(?))")
+        params.append(json.dumps([str(location) for location in locations]))
+    for value, condition in ((date_from, "start_date >= ?"), (date_to, "start_date <= ?")):
+        if value is not None:
+            if not validate_date(str(value)):
+                raise ValueError(f"Invalid date {value!r}. Use YYYY-MM-DD.")
+            conditions.append(condition)
+            params.append(str(value))
+    for value, condition in ((temp_min, "temperature >= ?"), (temp_max, "temperature <= ?")):
+        if value is not None:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError("Temperature bounds must be numbers.")
+            conditions.append(condition)
+            params.append(value)
+    if not conditions:
+        raise ValueError("Give record ids or at least one filter.")
+    return " AND ".join(conditions), params
+
+@metrics.timed("weather_core_calls", function="count_matching_requests")
+def count_matching_requests(**filters):
+    """Count the requests a bulk update or delete with these filters would change; None if the filters are invalid."""
+    try:
+        clause, params = request_filter_clause(**filters)
+    except ValueError as e:
+        print(e)
+        metrics.error("count_matching_requests", "invalid_filter")
+        return None
+    return db.read_one(f"SELECT COUNT(*) FROM weather_requests WHERE {clause}", params)[0]
+
+@metrics.timed("weather_core_calls", function="update_weather_requests")
+def update_weather_requests(record_ids=None, new_temp=None, new_desc=None, **filters):
+    """Set the temperature and/or description of every matching request in one statement.
+
+    Requests are selected by record_ids and/or request_filter_clause()
+    filters. Returns the number updated, or None if the input is invalid.
+    """
+    if new_temp is not None and (isinstance(new_temp, bool) or not isinstance(new_temp, (int, float))):
+        print("Temperature must be a number.")
+        metrics.error("update_weather_requests", "invalid_temperature")
+        return None
+    assignments = [(column, value) for column, value in (("temperature", new_temp), ("weather_desc", new_desc))
+                   if value is not None]
+    if not assignments:
+        print("Nothing to update.")
+        metrics.error("update_weather_requests", "no_changes")
+        return None
+    if record_ids is not None and not record_ids:
+        return 0
+    try:
+        clause, params = request_filter_clause(record_ids, **filters)
+    except ValueError as e:
+        print(e)
+        metrics.error("update_weather_requests", "invalid_filter")
+        return None
+    
+    updated = db.execute(
+        f"UPDATE weather_requests SET {', '.join(f'{column} = ?' for column, _ in assignments)} WHERE {clause}",
+        [value for _, value in assignments] + params
+    )
+    print(f"Updated {updated} records.")
+    return updated
+
+@metrics.timed("weather_core_calls", function="update_weather_request")
+def update_weather_request(record_id, new_temp=None, new_desc=None):
+    """Update a weather request."""
+    if new_temp is None and new_desc is None:
+        return read_weather_request(record_id) is not None
+    
+    updated = update_weather_requests([record_id], new_temp, new_desc)
+    if updated is None:
+        return False
+    if not updated:
+        print("Record not found.")
+        metrics.error("update_weather_request", "not_found")
+        return False
+    
+    print("Record updated successfully.")
+    return True
+
+def read_request_forecast(record_id):
+    """Return the stored [(day, min, max, mean, description), ...] for a weather request."""
+    return db.read(
+        "SELECT day, temp_min, temp_max, temp_mean, weather_desc FROM request_forecasts WHERE request_id = ? ORDER BY day",
+        (int(record_id),)
+    )
+
+@metrics.timed("weather_core_calls", function="delete_weather_request")
+def delete_weather_request(record_id):
+    """Delete a weather request."""
+    if not db.execute("DELETE FROM weather_requests WHERE id = ?", (int(record_id),)):
+        print("Record not found.")
+        metrics.error("delete_weather_request", "not_found")
+        return False
+    
+    print("Record deleted successfully.")
+    return True
+
+@metrics.timed("weather_core_calls", function="delete_weather_requests")
+def delete_weather_requests(record_ids=None, **filters):
+    """Delete every request matching record_ids and/or request_filter_clause() filters in one statement.
+
+    Returns the number deleted, or None if the filters are invalid.
+    """
+    if record_ids is not None and not record_ids:
+        return 0
+    try:
+        clause, params = request_filter_clause(record_ids, **filters)
+    except ValueError as e:
+        print(e)
+        metrics.error("delete_weather_requests", "invalid_filter")
+        return None
+    
+    deleted = db.execute(f"DELETE FROM weather_requests WHERE {clause}", params)
+    print(f"Deleted {deleted} records.")
+    return deleted
+
+def search_youtube_videos(location):
+    """Run a YouTube search for a location's weather videos, bypassing the cache; None on a bad response."""
+    response = youtube_api.get_json("search", {
+        "part": "snippet",
+        "q": f"{location} weather",
+        "type": "video",
+        "key": YOUTUBE_API_KEY,
+        "maxResults": 3,
+    }, cost=YOUTUBE_SEARCH_COST)
+    
+    if "items" in response:
+        videos = []
+        for item in response["items"]:
+            title = item["snippet"]["title"]
+            video_id = item["id"]["videoId"]
+            videos.append({"title": title, "url": f"https://www.youtube.com/watch?v={video_id}"})
+        return videos
+    return None
+
+@metrics.timed("weather_core_calls", function="get_youtube_videos")
+def get_youtube_videos(location):
+    """Fetch YouTube videos for a location, cached per normalized location for VIDEO_CACHE_TTL."""
+    try:
+        return video_cache.get_or_fetch(location, search_youtube_videos) or []
+    except Exception as e:
+        print(f"Error: {e}")
+        metrics.error("get_youtube_videos", type(e).__name__)
+        return []
+
+def prefetch_youtube_videos(top_n=VIDEO_PREFETCH_TOP_N):
+    """Fill the video cache for the top_n most requested locations missing or due to expire.
+
+    Runs at background priority, so it queues behind interactive searches
+    and leaves them the reserved share of the daily quota. Returns the
+    number of locations fetched.
+    """
+    if youtube_api.limiter.exhausted(BACKGROUND, YOUTUBE_SEARCH_COST):
+        return 0  # nothing can be fetched until the quota resets
+    top = [location for location, _ in db.run(analysis.top_locations, top_n)]
+    fetched = 0
+    with priority(BACKGROUND):
+        for location in video_cache.expiring(top, within=VIDEO_PREFETCH_INTERVAL):
+            try:
+                video_cache.get_or_fetch(location, search_youtube_videos)
+                fetched += 1
+            except RateLimitExceeded as e:
+                print(f"Video prefetch stopped: {e}")
+                metrics.error("prefetch_youtube_videos", "rate_limited")
+                break
+            except Exception as e:
+                print(f"Video prefetch failed for {location}: {e}")
+                metrics.error("prefetch_youtube_videos", type(e).__name__)
+    return fetched
+
+def _prefetch_videos_forever():
+    while True:
+        try:
+            prefetch_youtube_videos()
+        except Exception as e:
+            print(f"Video prefetch failed: {e}")
+        time.sleep(VIDEO_PREFETCH_INTERVAL)
+
+def _start_video_prefetch():
+    thread = threading.Thread(target=_prefetch_videos_forever, name="video-prefetch", daemon=True)
+    thread.start()
+    return thread
+
+def start_background_tasks():
+    """Start the configured background work once per process: video prefetch, metrics endpoint, refresh scheduler.
+
+    Called by the Streamlit app only; cli.py and service.py never start these.
+    """
+    if VIDEO_PREFETCH_IN_BACKGROUND and YOUTUBE_API_KEY:
+        shared("video_prefetch", _start_video_prefetch)
+    if METRICS_PORT:
+        shared("metrics_server", lambda: metrics.start_http_server(METRICS_PORT))
+    if REFRESH_IN_BACKGROUND:
+        shared("refresh_scheduler", lambda: RefreshScheduler(
+            db, fetch_cached_weather, REFRESH_INTERVAL, REFRESH_CALLS_PER_MINUTE, limiter=openweather_api.limiter
+        ).start())
+
+def get_api_stats():
+    """Return latency/error metrics for each outbound API client."""
+    return [client.stats() for client in (geocoding_api, openweather_api, youtube_api)]
+
+def get_quota_usage():
+    """Return today's budget use and rate-limit counters for each provider."""
+    return [client.limiter.usage() for client in (geocoding_api, openweather_api, youtube_api)]
+
+def last_known_weather(location):
+    """Return the latest stored (datetime, temperature, description) for location, or None.
+
+    Used when live weather is unavailable, e.g. once the API budget is spent.
+    """
+    reading = db.run(observations.latest, location)
+    if reading is None:
+        return None
+    ts, temp, desc = reading
+    return datetime.fromtimestamp(ts), temp, desc
+
+def get_coalescing_stats():
+    """Return issued vs. coalesced upstream lookups for each single-flight layer."""
+    return [
+        {"cache": name, "issued": cache.flight.stats["issued"], "coalesced": cache.flight.stats["coalesced"]}
+        for name, cache in (("geocode", geocode_cache), ("weather", weather_cache), ("forecast", forecast_cache))
+    ]
+
+@metrics.timed("weather_core_calls", function="export_to_csv")
+def export_to_csv(filename="weather_data.csv"):
+    """Export weather data to CSV, streaming rows from the database in chunks."""
+    with open(filename, "wb") as csvfile:
+        db.run(lambda conn: export_rows(
+            iter_chunks(conn, f"SELECT {REQUEST_COLUMNS} FROM weather_requests"),
+            EXPORT_COLUMNS,
+            "csv",
+            csvfile
+        ), op="export")
+    return filename
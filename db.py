@@ -0,0 +1,154 @@
+"""Thread-safe access to weather_app.db for concurrent Streamlit sessions.
+
+Reads use one connection per thread (SQLite connections must not be shared
+across threads), opened read-only in spirit via `PRAGMA query_only`. The
+connection is not handed out: queries go through read(), read_one() or
+run(), so every one is counted in the weather_db_queries metrics. All
+writes are funnelled through a single writer thread: callers hand it a
+function, the writer runs whatever has queued up inside one transaction
+(each job in its own savepoint) and commits once, so a burst of writes
+costs one fsync instead of one per write. WAL mode lets readers proceed
+while the writer commits.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import metrics
+import migrations
+
+
+class Database:
+    """Per-thread read connections plus a single batching writer for one SQLite file."""
+
+    def __init__(self, path, busy_timeout=5000, max_batch=500):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.max_batch = max_batch
+        self.stats = Counter()
+
+        migrations.connect(path).close()
+
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        migrations.configure(conn)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        return conn
+
+    @property
+    def _conn(self):
+        """The calling thread's read-only connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+            conn.execute("PRAGMA query_only = ON")
+            self.stats["read_connections"] += 1
+        return conn
+
+    def read(self, query, params=()):
+        """Run a read query on this thread's connection and return all rows."""
+        with metrics.timed("weather_db_queries", op="read"):
+            return self._conn.execute(query, params).fetchall()
+
+    def read_one(self, query, params=()):
+        with metrics.timed("weather_db_queries", op="read_one"):
+            return self._conn.execute(query, params).fetchone()
+
+    def run(self, func, *args, op="read"):
+        """Run func(conn, *args) on this thread's read connection and return its result.
+
+        For helpers that take a connection (aggregates, analysis, exports);
+        the whole call is timed as one weather_db_queries{op} query.
+        """
+        with metrics.timed("weather_db_queries", op=op):
+            return func(self._conn, *args)
+
+    def submit(self, func, *args):
+        """Queue func(conn, *args) for the writer thread and return a Future for its result."""
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def write(self, func, *args):
+        """Run func(conn, *args) on the writer thread and block until it has been committed."""
+        with metrics.timed("weather_db_queries", op="write"):
+            return self.submit(func, *args).result()
+
+    def execute(self, query, params=()):
+        """Run one write statement and return the number of rows it changed."""
+        return self.write(lambda conn: conn.execute(query, params).rowcount)
+
+    def executemany(self, query, rows):
+        return self.write(lambda conn: conn.executemany(query, rows).rowcount)
+
+    def _write_loop(self):
+        conn = self._open()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            stop = False
+            # Group commit: take whatever else is already waiting
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+            self._run_batch(conn, batch)
+            if stop:
+                break
+        conn.close()
+
+    def _run_batch(self, conn, batch):
+        results = []
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, func, args in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    results.append((future, func(conn, *args), None))
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.stats["failed_commits"] += 1
+            metrics.inc("weather_db_commits_errors_total", error=type(e).__name__)
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        self.stats["commits"] += 1
+        self.stats["writes"] += len(batch)
+        metrics.inc("weather_db_commits_total")
+        metrics.inc("weather_db_committed_jobs_total", len(batch))
+        metrics.observe("weather_db_commits_seconds", time.perf_counter() - start)
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                self.stats["failed_writes"] += 1
+                future.set_exception(error)
+
+    def close(self):
+        """Stop the writer after it has drained the queue."""
+        self._queue.put(None)
+        self._writer.join()
@@ -0,0 +1,131 @@
+"""Streaming export of query results to CSV, JSON, NDJSON and Parquet.
+
+Rows are pulled from the cursor `chunk_size` at a time and written straight
+to the output, so memory use stays flat however many rows are exported.
+Text formats can be gzip-compressed on the fly.
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+
+FORMATS = {
+    # name: (file extension, mime type)
+    "csv": ("csv", "text/csv"),
+    "json": ("json", "application/json"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Files spill from memory to disk above this size
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def iter_chunks(conn, query, params=(), chunk_size=10000):
+    """Yield lists of up to chunk_size rows for query."""
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def _write_csv(chunks, columns, out):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def _write_ndjson(chunks, columns, out):
+    count = 0
+    for rows in chunks:
+        out.write("".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows))
+        count += len(rows)
+    return count
+
+
+def _write_json(chunks, columns, out):
+    count = 0
+    out.write("[")
+    for rows in chunks:
+        for row in rows:
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            count += 1
+    out.write("\n]\n" if count else "]\n")
+    return count
+
+
+def _write_parquet(chunks, columns, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow).")
+
+    writer = None
+    count = 0
+    try:
+        for rows in chunks:
+            # One row group per chunk
+            table = pa.Table.from_pydict({name: list(values) for name, values in zip(columns, zip(*rows))})
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            count += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+_TEXT_WRITERS = {"csv": _write_csv, "json": _write_json, "ndjson": _write_ndjson}
+
+
+def export_rows(chunks, columns, fmt, out, compress=False):
+    """Write row chunks to the binary file object out in format fmt; returns the row count.
+
+    compress gzips text formats (Parquet is already compressed).
+    """
+    if fmt == "parquet":
+        return _write_parquet(chunks, columns, out)
+    if fmt not in _TEXT_WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    raw = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    try:
+        return _TEXT_WRITERS[fmt](chunks, columns, text)
+    finally:
+        text.flush()
+        text.detach()
+        if compress:
+            raw.close()
+
+
+def export_query(conn, query, params, columns, fmt, compress=False, chunk_size=10000):
+    """Run query and stream the result into a fresh per-call temporary file.
+
+    Returns (file object rewound to the start, row count). The file lives in
+    memory until it outgrows SPOOL_MAX_SIZE, then on disk; it is deleted when
+    closed, so concurrent exports never share a file.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    count = export_rows(iter_chunks(conn, query, params, chunk_size), columns, fmt, out, compress)
+    out.seek(0)
+    return out, count
+
+
+def export_filename(base, fmt, compress=False):
+    extension = FORMATS[fmt][0]
+    return f"{base}.{extension}.gz" if compress and fmt != "parquet" else f"{base}.{extension}"
+
+
+def export_mime(fmt, compress=False):
+    return "application/gzip" if compress and fmt != "parquet" else FORMATS[fmt][1]
@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Upstream statuses worth another attempt; anything else is returned to the caller.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ApiClient:
+    """Pooled, retrying JSON client for one upstream provider.
+
+    One `requests.Session` is kept per client, so connections to the
+    provider's host(s) stay alive between calls. Every call has a connect and
+    read timeout, and transient failures (connection errors, timeouts and
+    RETRY_STATUSES) are retried with exponential backoff and full jitter.
+    An optional ratelimit.RateLimiter is consulted before every attempt and
+    held back when the provider answers 429.
+    """
+
+    def __init__(self, name, base_url, connect_timeout=3.05, read_timeout=10, retries=3,
+                 backoff=0.5, max_backoff=8, pool_size=10, limiter=None):
+        self.name = name
+        self.limiter = limiter
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.counters = Counter()
+        self.latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def get_json(self, path, params=None, cost=1):
+        """GET base_url + path and return the decoded JSON body.
+
+        cost is charged to the limiter's daily budget per attempt. Raises
+        requests.RequestException once retries are exhausted, and
+        ratelimit.RateLimitExceeded when the limiter refuses the call.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(cost)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES:
+                    response.raise_for_status()
+                data = response.json()
+            except requests.RequestException as e:
+                self._record(time.perf_counter() - start, error=type(e).__name__)
+                if attempt >= self.retries or not _is_transient(e):
+                    raise
+                attempt += 1
+                self._count("retries")
+                delay = self._backoff_delay(attempt, e)
+                if self.limiter is not None and getattr(e.response, "status_code", None) == 429:
+                    # Slow every caller of this provider down, not just this one
+                    self.limiter.penalize(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            self._record(time.perf_counter() - start)
+            return data
+
+    def _backoff_delay(self, attempt, error):
+        retry_after = getattr(getattr(error, "response", None), "headers", {}).get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+        metrics.inc(f"weather_api_{key}_total", provider=self.name)
+
+    def _record(self, elapsed, error=None):
+        with self._lock:
+            self.counters["requests"] += 1
+            if error:
+                self.counters["errors"] += 1
+                self.counters[f"error:{error}"] += 1
+            self.latencies.append(elapsed)
+        # Every attempt is timed: API calls are slow enough that sampling buys nothing
+        metrics.inc("weather_api_requests_total", provider=self.name)
+        metrics.observe("weather_api_requests_seconds", elapsed, provider=self.name)
+        if error:
+            metrics.inc("weather_api_requests_errors_total", provider=self.name, error=error)
+
+    def stats(self):
+        """Return request/error/retry counts and latency percentiles (seconds) for recent calls."""
+        with self._lock:
+            counters = dict(self.counters)
+            latencies = sorted(self.latencies)
+        stats = {"provider": self.name, **counters}
+        if latencies:
+            stats["latency_avg"] = sum(latencies) / len(latencies)
+            stats["latency_p50"] = latencies[len(latencies) // 2]
+            stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats["latency_max"] = latencies[-1]
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+def _is_transient(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in RETRY_STATUSES
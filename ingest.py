@@ -0,0 +1,132 @@
+"""Bulk import of weather requests from CSV or JSONL files.
+
+Usage:
+    python ingest.py requests.csv [--batch-size 1000] [--concurrency 16] [--restart]
+
+CSV files need location, start_date and end_date columns (a header row is
+optional); JSONL files need the same keys on each line. Weather is fetched
+concurrently for the distinct locations in each batch, and every batch is
+written with a single executemany in one WAL transaction together with the
+file's progress, so an interrupted import resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+import core
+from cache import normalize_location
+from ratelimit import BATCH, priority
+
+FIELDS = ["location", "start_date", "end_date"]
+
+
+def read_rows(path):
+    """Yield (location, start_date, end_date) tuples from a CSV or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield tuple(str(record.get(field, "")).strip() for field in FIELDS)
+        else:
+            reader = csv.reader(f)
+            first = next(reader, None)
+            if first is None:
+                return
+            header = [col.strip().lower() for col in first]
+            if set(FIELDS) <= set(header):
+                indexes = [header.index(field) for field in FIELDS]
+            else:
+                indexes = [0, 1, 2]
+                yield tuple(first[i].strip() for i in indexes)
+            for row in reader:
+                if row:
+                    yield tuple(row[i].strip() if i < len(row) else "" for i in indexes)
+
+
+def _write_batch(conn, records, source, size, done, updated_at):
+    core.save_requests(conn, records)
+    conn.execute(
+        "INSERT OR REPLACE INTO ingest_progress (source, size, rows_done, updated_at) VALUES (?, ?, ?, ?)",
+        (source, size, done, updated_at)
+    )
+
+
+def _resume_point(db, source, size, restart):
+    row = db.read_one("SELECT size, rows_done FROM ingest_progress WHERE source = ?", (source,))
+    if row is None or restart:
+        return 0
+    if row[0] != size:
+        print(f"{source} changed since the last run; starting over.")
+        return 0
+    return row[1]
+
+
+def ingest_file(path, batch_size=1000, concurrency=core.BATCH_CONCURRENCY, restart=False):
+    """Import weather requests from path, resuming a previous run unless restart is set.
+
+    Returns a dict with counts of rows inserted, rejected (bad dates) and
+    failed (weather lookup failed), plus rows skipped as already imported.
+    """
+    db = core.db
+    source = os.path.abspath(path)
+    size = os.path.getsize(path)
+    done = _resume_point(db, source, size, restart)
+    if done:
+        print(f"Resuming {path} after {done} rows.")
+
+    stats = {"skipped": done, "inserted": 0, "rejected": 0, "failed": 0}
+    rows = islice(read_rows(path), done, None)
+    start = time.perf_counter()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        valid = []
+        for location, start_date, end_date in batch:
+            if location and core.validate_date(start_date) and core.validate_date(end_date) and start_date <= end_date:
+                valid.append((location, start_date, end_date))
+            else:
+                stats["rejected"] += 1
+
+        with priority(BATCH):
+            weather = core.get_current_weather_batch([row[0] for row in valid], concurrency)
+        by_key = {normalize_location(location): result for location, result in weather.items()}
+        request_time = datetime.now().isoformat()
+        records = []
+        for location, start_date, end_date in valid:
+            temp, desc, lat, lng = by_key.get(normalize_location(location), (None, None, None, None))
+            if temp is None:
+                stats["failed"] += 1
+                continue
+            records.append((location, lat, lng, start_date, end_date, temp, desc, request_time))
+
+        done += len(batch)
+        db.write(_write_batch, records, source, size, done, request_time)
+        stats["inserted"] += len(records)
+        elapsed = time.perf_counter() - start
+        print(f"{done} rows processed, {stats['inserted']} inserted ({stats['inserted'] / elapsed:.0f} rows/s)")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import weather requests from a CSV or JSONL file.")
+    parser.add_argument("path", help="CSV or JSONL file of location, start_date, end_date rows")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per transaction (default: 1000)")
+    parser.add_argument("--concurrency", type=int, default=core.BATCH_CONCURRENCY, help="concurrent weather lookups")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and import from the first row")
+    args = parser.parse_args()
+
+    stats = ingest_file(args.path, args.batch_size, args.concurrency, args.restart)
+    print(f"Done: {stats['inserted']} inserted, {stats['rejected']} rejected, "
+          f"{stats['failed']} failed, {stats['skipped']} already imported.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Counters and latency histograms for outbound calls, SQLite and UI renders.
+
+Wrap work in `timed(name, **labels)` (a context manager or decorator): every
+call increments `<name>_total`, exceptions also increment
+`<name>_errors_total{error=...}`, and a sample of calls is timed into the
+`<name>_seconds` histogram. The sample rate defaults to SAMPLE_RATE
+(METRICS_SAMPLE_RATE in the environment) and can be set per span; slow,
+rare spans such as API calls pass sample=1. Inside `trace()` every span on
+the current thread is timed and collected, which the UI uses for its
+per-rerun timing panel.
+
+`render()` returns everything in the Prometheus text format; service.py
+serves it on /metrics and start_http_server() does the same for other
+processes (e.g. Streamlit, see METRICS_PORT in core.py).
+"""
+import contextlib
+import functools
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", "0.1"))
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    """Thread-safe store of labelled counters and histograms."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def counter(self, name, **labels):
+        """Return a counter's current value (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), values in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+REGISTRY = Registry()
+_local = threading.local()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    REGISTRY.observe(name, seconds, **labels)
+    spans = getattr(_local, "spans", None)
+    if spans is not None:
+        spans.append((name, labels, seconds))
+
+
+def error(where, reason):
+    """Count an error that is handled (e.g. printed) rather than raised."""
+    REGISTRY.inc("weather_errors_total", where=where, reason=reason)
+
+
+def render():
+    return REGISTRY.render()
+
+
+class timed:
+    """Count calls and errors of a span and time a sample of them; use with `with` or as a decorator."""
+
+    __slots__ = ("name", "sample", "labels", "_start")
+
+    def __init__(self, name, sample=None, **labels):
+        self.name = name
+        self.sample = sample
+        self.labels = labels
+        self._start = None
+
+    def __enter__(self):
+        rate = SAMPLE_RATE if self.sample is None else self.sample
+        if rate >= 1 or getattr(_local, "spans", None) is not None or random.random() < rate:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.inc(f"{self.name}_total", **self.labels)
+        # Streamlit's rerun/stop signals are BaseExceptions and not errors
+        if exc_type is not None and issubclass(exc_type, Exception):
+            REGISTRY.inc(f"{self.name}_errors_total", error=exc_type.__name__, **self.labels)
+        if self._start is not None:
+            observe(f"{self.name}_seconds", time.perf_counter() - self._start, **self.labels)
+        return False
+
+    def __call__(self, func):
+        name, sample, labels = self.name, self.sample, self.labels
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name, sample, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+@contextlib.contextmanager
+def trace():
+    """Time every span finished on this thread inside the block; yields the list of (name, labels, seconds)."""
+    previous = getattr(_local, "spans", None)
+    spans = _local.spans = []
+    try:
+        yield spans
+    finally:
+        _local.spans = previous
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread and return the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,376 @@
+"""Versioned schema migrations for weather_app.db.
+
+The schema version lives in SQLite's `PRAGMA user_version`. Each entry in
+MIGRATIONS upgrades the database by one version inside a single transaction,
+so a failed migration leaves the previous version intact. Each transaction
+takes the write lock up front and re-reads the version under it, so several
+processes opening a new database at once apply every step exactly once.
+"""
+import sqlite3
+
+# Per-connection settings applied by configure()
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -32000,  # KiB
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+MIGRATIONS = [
+    (1, "create weather_requests", [
+        '''
+        CREATE TABLE IF NOT EXISTS weather_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            location TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            start_date TEXT,
+            end_date TEXT,
+            temperature REAL,
+            weather_desc TEXT,
+            request_time TEXT
+        )
+        ''',
+    ]),
+    (2, "normalized location key and covering indexes", [
+        # Lower-cased, trimmed location for case-insensitive lookups. VIRTUAL
+        # keeps it out of the table rows, but it is indexed below, so every
+        # insert and every update of location computes it and updates the index.
+        "ALTER TABLE weather_requests ADD COLUMN location_key TEXT GENERATED ALWAYS AS (lower(trim(location))) VIRTUAL",
+        # Recent Locations: ORDER BY request_time DESC LIMIT 5
+        "CREATE INDEX IF NOT EXISTS idx_requests_time ON weather_requests (request_time, location)",
+        # Most Searched Location, SELECT DISTINCT location
+        "CREATE INDEX IF NOT EXISTS idx_requests_location ON weather_requests (location)",
+        # Case-insensitive location search and prefix lookups
+        "CREATE INDEX IF NOT EXISTS idx_requests_location_key ON weather_requests (location_key)",
+        # Export date range filter
+        "CREATE INDEX IF NOT EXISTS idx_requests_start_date ON weather_requests (start_date, location)",
+        "ANALYZE",
+    ]),
+    (3, "trigram full-text index over location and weather_desc", [
+        # External-content FTS5 table: stores only the index, rows come from
+        # weather_requests. The trigram tokenizer makes LIKE '%text%' and
+        # substring MATCH queries of 3+ characters index lookups.
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS weather_requests_fts USING fts5(
+            location, weather_desc,
+            content='weather_requests', content_rowid='id', tokenize='trigram'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS weather_requests_fts_insert AFTER INSERT ON weather_requests BEGIN
+            INSERT INTO weather_requests_fts (rowid, location, weather_desc)
+            VALUES (new.id, new.location, new.weather_desc);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS weather_requests_fts_delete AFTER DELETE ON weather_requests BEGIN
+            INSERT INTO weather_requests_fts (weather_requests_fts, rowid, location, weather_desc)
+            VALUES ('delete', old.id, old.location, old.weather_desc);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS weather_requests_fts_update
+        AFTER UPDATE OF location, weather_desc ON weather_requests BEGIN
+            INSERT INTO weather_requests_fts (weather_requests_fts, rowid, location, weather_desc)
+            VALUES ('delete', old.id, old.location, old.weather_desc);
+            INSERT INTO weather_requests_fts (rowid, location, weather_desc)
+            VALUES (new.id, new.location, new.weather_desc);
+        END
+        ''',
+        "INSERT INTO weather_requests_fts (weather_requests_fts) VALUES ('rebuild')",
+    ]),
+    (4, "keyset pagination indexes and table version counter", [
+        # Every index ends in the rowid, so these serve ORDER BY (col, id) keysets.
+        "DROP INDEX IF EXISTS idx_requests_time",
+        "CREATE INDEX idx_requests_time ON weather_requests (request_time)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_temperature ON weather_requests (temperature)",
+        # Bumped on every write so derived results (counts, analyses) can be
+        # cached until the data actually changes.
+        '''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO table_versions (name, version) VALUES ('weather_requests', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS weather_requests_version_insert AFTER INSERT ON weather_requests BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = 'weather_requests';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS weather_requests_version_update AFTER UPDATE ON weather_requests BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = 'weather_requests';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS weather_requests_version_delete AFTER DELETE ON weather_requests BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = 'weather_requests';
+        END
+        ''',
+    ]),
+    (5, "trigger-maintained Quick Stats aggregates", [
+        '''
+        CREATE TABLE IF NOT EXISTS request_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            row_count INTEGER NOT NULL,
+            temp_sum REAL NOT NULL,
+            temp_count INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS location_counts (
+            location TEXT PRIMARY KEY,
+            request_count INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_location_counts_count ON location_counts (request_count)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS request_totals_insert AFTER INSERT ON weather_requests BEGIN
+            UPDATE request_totals SET
+                row_count = row_count + 1,
+                temp_sum = temp_sum + coalesce(new.temperature, 0),
+                temp_count = temp_count + (new.temperature IS NOT NULL)
+            WHERE id = 1;
+            INSERT INTO location_counts (location, request_count) VALUES (new.location, 1)
+            ON CONFLICT (location) DO UPDATE SET request_count = request_count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS request_totals_delete AFTER DELETE ON weather_requests BEGIN
+            UPDATE request_totals SET
+                row_count = row_count - 1,
+                temp_sum = temp_sum - coalesce(old.temperature, 0),
+                temp_count = temp_count - (old.temperature IS NOT NULL)
+            WHERE id = 1;
+            UPDATE location_counts SET request_count = request_count - 1 WHERE location = old.location;
+            DELETE FROM location_counts WHERE location = old.location AND request_count <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS request_totals_update
+        AFTER UPDATE OF location, temperature ON weather_requests BEGIN
+            UPDATE request_totals SET
+                temp_sum = temp_sum - coalesce(old.temperature, 0) + coalesce(new.temperature, 0),
+                temp_count = temp_count - (old.temperature IS NOT NULL) + (new.temperature IS NOT NULL)
+            WHERE id = 1;
+            UPDATE location_counts SET request_count = request_count - 1
+            WHERE location = old.location AND old.location IS NOT new.location;
+            DELETE FROM location_counts WHERE location = old.location AND request_count <= 0;
+            INSERT INTO location_counts (location, request_count)
+            SELECT new.location, 1 WHERE old.location IS NOT new.location
+            ON CONFLICT (location) DO UPDATE SET request_count = request_count + 1;
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO request_totals (id, row_count, temp_sum, temp_count)
+        SELECT 1, COUNT(*), coalesce(SUM(temperature), 0), COUNT(temperature) FROM weather_requests
+        ''',
+        '''
+        INSERT OR REPLACE INTO location_counts (location, request_count)
+        SELECT location, COUNT(*) FROM weather_requests GROUP BY location
+        ''',
+    ]),
+    (6, "refresh tracking for active requests", [
+        "ALTER TABLE weather_requests ADD COLUMN refreshed_at TEXT",
+        # Active requests (window covering today) are found by end_date >= today
+        "CREATE INDEX IF NOT EXISTS idx_requests_end_date ON weather_requests (end_date)",
+    ]),
+    (7, "observation time series with rollups", [
+        '''
+        CREATE TABLE IF NOT EXISTS observation_locations (
+            id INTEGER PRIMARY KEY,
+            location_key TEXT NOT NULL UNIQUE,
+            location TEXT NOT NULL
+        )
+        ''',
+        # Append-only raw points, clustered by (location_id, ts) for range scans
+        '''
+        CREATE TABLE IF NOT EXISTS observations (
+            location_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            temperature REAL NOT NULL,
+            weather_desc TEXT,
+            PRIMARY KEY (location_id, ts)
+        ) WITHOUT ROWID
+        ''',
+        # Hourly, daily and monthly min/max/sum/count per location; location_id 0 covers all locations
+        '''
+        CREATE TABLE IF NOT EXISTS observation_rollups (
+            level TEXT NOT NULL,
+            location_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            temp_min REAL NOT NULL,
+            temp_max REAL NOT NULL,
+            temp_sum REAL NOT NULL,
+            PRIMARY KEY (level, location_id, bucket)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS observations_rollup
+        AFTER INSERT ON observations BEGIN
+            INSERT INTO observation_rollups (level, location_id, bucket, samples, temp_min, temp_max, temp_sum)
+            SELECT level, location_id, bucket, 1, new.temperature, new.temperature, new.temperature
+            FROM (SELECT 'hour' AS level, new.ts - new.ts % 3600 AS bucket
+                  UNION ALL SELECT 'day', new.ts - new.ts % 86400
+                  UNION ALL SELECT 'month', CAST(strftime('%s', new.ts, 'unixepoch', 'start of month') AS INTEGER))
+            CROSS JOIN (SELECT new.location_id AS location_id UNION ALL SELECT 0)
+            WHERE true
+            ON CONFLICT (level, location_id, bucket) DO UPDATE SET
+                samples = samples + 1,
+                temp_min = MIN(temp_min, excluded.temp_min),
+                temp_max = MAX(temp_max, excluded.temp_max),
+                temp_sum = temp_sum + excluded.temp_sum;
+        END
+        ''',
+        # Seed the history with the reading stored on each existing request
+        '''
+        INSERT OR IGNORE INTO observation_locations (location_key, location)
+        SELECT location_key, location FROM weather_requests WHERE location IS NOT NULL
+        ''',
+        '''
+        INSERT OR IGNORE INTO observations (location_id, ts, temperature, weather_desc)
+        SELECT observation_locations.id, CAST(strftime('%s', request_time, 'utc') AS INTEGER), temperature, weather_desc
+        FROM weather_requests JOIN observation_locations USING (location_key)
+        WHERE temperature IS NOT NULL AND strftime('%s', request_time) IS NOT NULL
+        ''',
+    ]),
+    (8, "daily forecast rows per request", [
+        '''
+        CREATE TABLE IF NOT EXISTS request_forecasts (
+            request_id INTEGER NOT NULL REFERENCES weather_requests (id) ON DELETE CASCADE,
+            day TEXT NOT NULL,
+            temp_min REAL,
+            temp_max REAL,
+            temp_mean REAL,
+            weather_desc TEXT,
+            issued_at TEXT,
+            PRIMARY KEY (request_id, day)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (9, "R*Tree index over request coordinates", [
+        # One degenerate box per request; bounding-box queries join back to weather_requests on id
+        "CREATE VIRTUAL TABLE IF NOT EXISTS request_points USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS request_points_insert AFTER INSERT ON weather_requests
+        WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+            INSERT INTO request_points VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS request_points_delete AFTER DELETE ON weather_requests BEGIN
+            DELETE FROM request_points WHERE id = old.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS request_points_update AFTER UPDATE OF latitude, longitude ON weather_requests BEGIN
+            DELETE FROM request_points WHERE id = old.id;
+            INSERT INTO request_points SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+            WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+        END
+        ''',
+        '''
+        INSERT INTO request_points
+        SELECT id, latitude, latitude, longitude, longitude FROM weather_requests
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''',
+    ]),
+    (10, "daily API quota usage", [
+        '''
+        CREATE TABLE IF NOT EXISTS api_quota (
+            provider TEXT NOT NULL,
+            day TEXT NOT NULL,
+            used INTEGER NOT NULL,
+            PRIMARY KEY (provider, day)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (11, "persistent YouTube search cache", [
+        # Search results per normalized location as JSON; see VideoCache in cache.py
+        '''
+        CREATE TABLE IF NOT EXISTS video_cache (
+            key TEXT PRIMARY KEY,
+            videos TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (12, "persistent geocode cache", [
+        # Coordinates per normalized location; see GeocodeCache in cache.py.
+        # Databases that predate this migration already have the table.
+        '''
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            key TEXT PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (13, "CSV import progress", [
+        # Rows imported per source file, for resuming; see ingest.py.
+        # Databases that predate this migration already have the table.
+        '''
+        CREATE TABLE IF NOT EXISTS ingest_progress (
+            source TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            rows_done INTEGER NOT NULL,
+            updated_at TEXT
+        )
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def configure(conn):
+    """Apply PRAGMAS to a freshly opened connection."""
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """Apply pending migrations up to target (default: latest) and return the resulting version."""
+    target = LATEST_VERSION if target is None else target
+    version = get_version(conn)
+    for number, description, statements in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        try:
+            # Take the write lock before looking at the version: another
+            # process may have applied this step since it was read above.
+            conn.execute("BEGIN IMMEDIATE")
+            version = get_version(conn)
+            if number <= version:
+                conn.commit()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            print(f"Migration {number} ({description}) failed.")
+            raise
+        version = number
+    return version
+
+
+def connect(path, target=None, **kwargs):
+    """Open path with the standard PRAGMAS and bring its schema up to date."""
+    # Long enough to wait out another process's migration of a large table
+    kwargs.setdefault("timeout", 60)
+    conn = sqlite3.connect(path, **kwargs)
+    configure(conn)
+    migrate(conn, target)
+    return conn
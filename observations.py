@@ -0,0 +1,177 @@
+"""Per-location temperature history with hourly/daily/monthly rollups.
+
+Raw points go into the append-only `observations` table (see migration 7
+in migrations.py), keyed by (location_id, ts) with ts in Unix seconds. A
+trigger folds every new point into `observation_rollups`, which keeps
+min/max/sum/count per hour, day and calendar month for each location and
+for all locations together (location_id 0). Retention drops old raw points
+and hourly rollups while daily and monthly rollups are kept, and range
+queries read from the finest level that is still retained and fits the
+requested number of points.
+
+Usage:
+    python observations.py retain [--raw-days 30] [--hourly-days 365]
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+import migrations
+
+# Raw points and hourly rollups older than this are dropped by apply_retention()
+RAW_RETENTION_DAYS = 30
+HOURLY_RETENTION_DAYS = 365
+
+# Approximate bucket width in seconds per rollup level, finest first
+LEVELS = {"hour": 3600, "day": 86400, "month": 30 * 86400}
+
+ALL_LOCATIONS = 0
+
+_INSERT_LOCATION_SQL = '''
+INSERT OR IGNORE INTO observation_locations (location_key, location) VALUES (lower(trim(?)), trim(?))
+'''
+
+_INSERT_OBSERVATION_SQL = '''
+INSERT OR IGNORE INTO observations (location_id, ts, temperature, weather_desc)
+SELECT id, ?, ?, ? FROM observation_locations WHERE location_key = lower(trim(?))
+'''
+
+
+def _timestamp(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def bucket_start(level, ts):
+    """Return the start (Unix seconds, UTC) of the level bucket containing ts."""
+    if level == "month":
+        day = datetime.fromtimestamp(ts, timezone.utc)
+        return int(datetime(day.year, day.month, 1, tzinfo=timezone.utc).timestamp())
+    return ts - ts % LEVELS[level]
+
+
+def record(conn, rows):
+    """Append (location, ts, temperature, description) rows; ts is a datetime, ISO string or Unix seconds.
+
+    Runs on a writable connection (e.g. via Database.write). A second point
+    for the same location and second is ignored. Returns the rows added.
+    """
+    rows = [(location, _timestamp(ts), temp, desc) for location, ts, temp, desc in rows if temp is not None]
+    conn.executemany(_INSERT_LOCATION_SQL, [(location, location) for location, _, _, _ in rows])
+    return conn.executemany(
+        _INSERT_OBSERVATION_SQL, [(ts, temp, desc, location) for location, ts, temp, desc in rows]
+    ).rowcount
+
+
+def apply_retention(conn, now=None, raw_days=RAW_RETENTION_DAYS, hourly_days=HOURLY_RETENTION_DAYS):
+    """Delete raw points older than raw_days and hourly rollups older than hourly_days.
+
+    Returns (raw points deleted, hourly rollups deleted).
+    """
+    now = int(time.time()) if now is None else _timestamp(now)
+    raw = conn.execute("DELETE FROM observations WHERE ts < ?", (now - raw_days * 86400,)).rowcount
+    hourly = conn.execute(
+        "DELETE FROM observation_rollups WHERE level = 'hour' AND bucket < ?", (now - hourly_days * 86400,)
+    ).rowcount
+    return raw, hourly
+
+
+def list_locations(conn):
+    """Return [(location_id, location), ...] for every location with history, by name."""
+    return conn.execute("SELECT id, location FROM observation_locations ORDER BY location").fetchall()
+
+
+def location_id(conn, location):
+    row = conn.execute(
+        "SELECT id FROM observation_locations WHERE location_key = lower(trim(?))", (location,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def latest(conn, location):
+    """Return the newest (ts, temperature, description) for location, or None.
+
+    Falls back to the newest daily mean once raw points have been retired.
+    """
+    found = location_id(conn, location)
+    if found is None:
+        return None
+    row = conn.execute(
+        "SELECT ts, temperature, weather_desc FROM observations WHERE location_id = ? ORDER BY ts DESC LIMIT 1",
+        (found,)
+    ).fetchone()
+    if row is None:
+        row = conn.execute('''
+            SELECT bucket, temp_sum / samples, NULL FROM observation_rollups
+            WHERE level = 'day' AND location_id = ? ORDER BY bucket DESC LIMIT 1
+        ''', (found,)).fetchone()
+    return row
+
+
+def earliest(conn, location_id=ALL_LOCATIONS):
+    """Return the start of the first month with data for location_id, or None."""
+    return conn.execute(
+        "SELECT MIN(bucket) FROM observation_rollups WHERE level = 'month' AND location_id = ?", (location_id,)
+    ).fetchone()[0]
+
+
+def pick_level(conn, location_id, start, end, max_points=500, now=None,
+               raw_days=RAW_RETENTION_DAYS, hourly_days=HOURLY_RETENTION_DAYS):
+    """Return the finest of "raw", "hour", "day", "month" that covers start..end in at most max_points."""
+    now = int(time.time()) if now is None else now
+    if location_id != ALL_LOCATIONS and start >= now - raw_days * 86400:
+        # Raw points are irregular, so count them (bounded) instead of estimating
+        raw_points = conn.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM observations WHERE location_id = ? AND ts BETWEEN ? AND ? LIMIT ?
+            )
+        ''', (location_id, start, end, max_points + 1)).fetchone()[0]
+        if raw_points <= max_points:
+            return "raw"
+    retained = {"hour": now - hourly_days * 86400}
+    for level, width in LEVELS.items():
+        if (end - start) / width <= max_points and start >= retained.get(level, start):
+            return level
+    return "month"
+
+
+def series(conn, location_id, start, end, max_points=500, now=None):
+    """Return (level, [(ts, mean, min, max, samples), ...]) for location_id between start and end.
+
+    start and end are datetimes or Unix seconds; location_id ALL_LOCATIONS
+    aggregates every location. Raw points are returned as-is (min = max = mean).
+    """
+    start, end = _timestamp(start), _timestamp(end)
+    level = pick_level(conn, location_id, start, end, max_points, now)
+    if level == "raw":
+        rows = conn.execute('''
+            SELECT ts, temperature, temperature, temperature, 1 FROM observations
+            WHERE location_id = ? AND ts BETWEEN ? AND ? ORDER BY ts
+        ''', (location_id, start, end)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT bucket, temp_sum / samples, temp_min, temp_max, samples FROM observation_rollups
+            WHERE level = ? AND location_id = ? AND bucket BETWEEN ? AND ? ORDER BY bucket
+        ''', (level, location_id, bucket_start(level, start), end)).fetchall()
+    return level, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the observation retention policy.")
+    parser.add_argument("command", choices=["retain"])
+    parser.add_argument("--db", default="weather_app.db", help="database path (default: weather_app.db)")
+    parser.add_argument("--raw-days", type=int, default=RAW_RETENTION_DAYS)
+    parser.add_argument("--hourly-days", type=int, default=HOURLY_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    conn = migrations.connect(args.db)
+    with conn:
+        raw, hourly = apply_retention(conn, raw_days=args.raw_days, hourly_days=args.hourly_days)
+    print(f"Deleted {raw} raw observations and {hourly} hourly rollups.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Client-side rate limiting and daily quota accounting per API provider.
+
+Each provider gets a RateLimiter: a token bucket that spaces calls to a
+per-second budget, handing tokens to waiting callers in priority order
+(interactive before batch before background), plus a per-day budget kept
+in the `api_quota` table. Each call is charged there with one conditional
+UPDATE, so restarts don't reset the budget and the app, service.py and
+scheduler.py, sharing one database, share one budget per API key.
+The caller's priority is carried in a context variable; wrap batch or
+background work in `with priority(BATCH):`.
+"""
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+_priority = contextvars.ContextVar("api_priority", default=INTERACTIVE)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would exceed a provider's budget."""
+
+    def __init__(self, provider, reason):
+        super().__init__(f"{provider}: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Run the enclosed calls (in this thread or asyncio task) at the given priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class RateLimiter:
+    """Token bucket with priority waiters and a persisted daily budget for one provider.
+
+    per_second=None disables the bucket and per_day=None the daily budget.
+    `reserve` is the share of the daily budget kept for interactive calls.
+    Interactive callers give up after `interactive_wait` seconds in the
+    queue; batch and background callers wait as long as it takes.
+    """
+
+    def __init__(self, name, per_second=None, burst=None, per_day=None, reserve=0.2,
+                 interactive_wait=10, db=None):
+        self.name = name
+        self.rate = per_second
+        self.capacity = burst or max(1, per_second or 1)
+        self.per_day = per_day
+        self.reserve = reserve
+        self.interactive_wait = interactive_wait
+        self.db = db
+        self.stats = Counter()
+
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._waiters = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+        self._held_until = 0.0  # penalize() without a token bucket
+
+        self._day = _today()
+        self._used = 0  # today's usage as last seen in api_quota
+        self._sync()
+
+    def _sync(self):
+        """Reload today's usage from api_quota, where other processes charge it too."""
+        day = _today()
+        if self.db is not None:
+            row = self.db.read_one("SELECT used FROM api_quota WHERE provider = ? AND day = ?", (self.name, day))
+            self._day, self._used = day, row[0] if row else 0
+        elif day != self._day:
+            self._day, self._used = day, 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _limit(self, level):
+        return self.per_day if level == INTERACTIVE else self.per_day * (1 - self.reserve)
+
+    def _over_quota(self, cost, level):
+        if self.per_day is None:
+            return False
+        if self._day != _today():
+            self._sync()
+        return self._used + cost > self._limit(level)
+
+    def acquire(self, cost=1, level=None, timeout=None):
+        """Wait for a token and charge cost units to today's budget.
+
+        level defaults to the caller's priority(). Raises RateLimitExceeded if
+        the daily budget is spent or no token frees up within the timeout.
+        """
+        level = current_priority() if level is None else level
+        if timeout is None and level == INTERACTIVE:
+            timeout = self.interactive_wait
+        with self._cond:
+            # Usage only grows during a day, so a stale count can only under-reject here
+            if self._over_quota(cost, level):
+                self.stats["rejected_quota"] += 1
+                raise RateLimitExceeded(self.name, f"daily budget of {self.per_day} used up")
+            if self.rate is not None:
+                self._take_token(level, timeout)
+            else:
+                self._wait_out_penalty(timeout)
+            day = self._day
+        # Others, in this process or another, may have spent the budget while this caller queued
+        if not self._charge(cost, level, day):
+            with self._cond:
+                if self.rate is not None:
+                    self._tokens += 1
+                    self._cond.notify_all()
+                self.stats["rejected_quota"] += 1
+            raise RateLimitExceeded(self.name, f"daily budget of {self.per_day} used up")
+        with self._cond:
+            self.stats[f"granted:{PRIORITY_NAMES.get(level, level)}"] += 1
+
+    def _charge(self, cost, level, day):
+        """Add cost to day's usage unless that would pass the limit for level; return False if it would."""
+        if self.db is None:
+            with self._cond:
+                if self._over_quota(cost, level):
+                    return False
+                self._used += cost
+                return True
+        if self.per_day is None:
+            # Nothing to enforce: record usage without waiting for the write
+            self.db.submit(lambda conn: conn.execute('''
+                INSERT INTO api_quota (provider, day, used) VALUES (?, ?, ?)
+                ON CONFLICT (provider, day) DO UPDATE SET used = used + excluded.used
+            ''', (self.name, day, cost)))
+            with self._cond:
+                self._used += cost
+            return True
+
+        def charge(conn):
+            # cost <= limit was checked above, so only the update needs the condition
+            row = conn.execute('''
+                INSERT INTO api_quota (provider, day, used) VALUES (?, ?, ?)
+                ON CONFLICT (provider, day) DO UPDATE SET used = used + excluded.used
+                WHERE used + excluded.used <= ?
+                RETURNING used
+            ''', (self.name, day, cost, self._limit(level))).fetchone()
+            if row is not None:
+                return True, row[0]
+            return False, conn.execute("SELECT used FROM api_quota WHERE provider = ? AND day = ?",
+                                       (self.name, day)).fetchone()[0]
+
+        granted, used = self.db.write(charge)
+        with self._cond:
+            if self._day == day:
+                self._used = used
+        return granted
+
+    def _wait_out_penalty(self, timeout):
+        """Without a token bucket, wait until a penalize() hold has passed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._held_until - time.monotonic()
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self.stats["rejected_wait"] += 1
+                raise RateLimitExceeded(self.name, f"no capacity within {timeout}s")
+            self.stats["waits"] += 1
+            self._cond.wait(wait)
+
+    def _take_token(self, level, timeout):
+        entry = (level, next(self._sequence))
+        heapq.heappush(self._waiters, entry)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                self._refill()
+                first = self._waiters[0] == entry
+                if first and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                # Only the head of the queue sleeps until the next token; the rest wait to be notified
+                wait = (1 - self._tokens) / self.rate if first else None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected_wait"] += 1
+                        raise RateLimitExceeded(self.name, f"no capacity within {timeout}s")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.stats["waits"] += 1
+                self._cond.wait(wait)
+        finally:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def penalize(self, seconds):
+        """Hold back every caller for about `seconds`, e.g. after the provider answered 429."""
+        with self._cond:
+            if self.rate is None:
+                self._held_until = max(self._held_until, time.monotonic() + seconds)
+                return
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def exhausted(self, level=INTERACTIVE, cost=1):
+        """True if today's budget, as charged by every process, has no room left for a call costing cost at level."""
+        with self._cond:
+            self._sync()
+            return self._over_quota(cost, level)
+
+    def usage(self):
+        """Return a dict of today's usage and grant/rejection counts."""
+        with self._cond:
+            return {"provider": self.name, "day": self._day, "used": self._used, "per_day": self.per_day,
+                    **self.stats}
@@ -0,0 +1,157 @@
+"""Background refresh of stored weather for requests whose window covers today.
+
+Usage:
+    python scheduler.py [--interval 900] [--calls-per-minute 60] [--once]
+
+Each pass finds the active requests (start_date <= today <= end_date),
+groups them by coordinate cell so every distinct place costs one upstream
+call, fetches weather no faster than the rate budget allows, and writes the
+results back in batches through the database's writer thread, appending
+each reading to the observation history (observations.py). The same
+scheduler can run inside the Streamlit process as a daemon thread (see
+REFRESH_IN_BACKGROUND in core.py).
+"""
+import argparse
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime
+
+import observations
+from ratelimit import BACKGROUND, priority
+
+
+class RefreshScheduler:
+    """Periodically re-fetch weather for active requests.
+
+    fetch(lat, lng) must return (temperature, description) or None. With a
+    limiter (the RateLimiter behind fetch), a pass stops once its daily
+    budget has no room left for background calls.
+    """
+
+    def __init__(self, db, fetch, interval=900, calls_per_minute=60, batch_size=500, grid=0.01, limiter=None):
+        self.db = db
+        self.fetch = fetch
+        self.limiter = limiter
+        self.interval = interval
+        self.min_spacing = 60.0 / calls_per_minute if calls_per_minute else 0
+        self.batch_size = batch_size
+        self.grid = grid
+        self.stats = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def active_cells(self, today=None):
+        """Return {cell: (lat, lng, [request ids], {locations})} for requests whose window covers today."""
+        today = (today or date.today()).isoformat()
+        rows = self.db.read('''
+            SELECT id, location, latitude, longitude FROM weather_requests
+            WHERE end_date >= ? AND start_date <= ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+        ''', (today, today))
+        cells = defaultdict(lambda: [None, None, [], set()])
+        for request_id, location, lat, lng in rows:
+            cell = cells[(round(lat / self.grid), round(lng / self.grid))]
+            cell[0], cell[1] = lat, lng
+            cell[2].append(request_id)
+            cell[3].add(location)
+        return {key: tuple(value) for key, value in cells.items()}
+
+    def run_once(self, today=None):
+        """Refresh every active cell once; returns the number of requests updated.
+
+        Upstream calls run at background priority, behind interactive lookups.
+        """
+        with priority(BACKGROUND):
+            return self._run_once(today)
+
+    def _run_once(self, today):
+        cells = self.active_cells(today)
+        pending = []
+        readings = []
+        updated = 0
+        last_call = 0.0
+        for lat, lng, ids, locations in cells.values():
+            if self._stop.is_set():
+                break
+            if self.limiter is not None and self.limiter.exhausted(BACKGROUND):
+                print("Refresh stopped: the daily API budget for background calls is used up.")
+                self.stats["quota_stops"] += 1
+                break
+            wait = last_call + self.min_spacing - time.monotonic()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            last_call = time.monotonic()
+            try:
+                result = self.fetch(lat, lng)
+            except Exception as e:
+                print(f"Refresh failed for ({lat}, {lng}): {e}")
+                result = None
+            self.stats["calls"] += 1
+            if result is None:
+                self.stats["failures"] += 1
+                continue
+
+            refreshed_at = datetime.now().isoformat()
+            pending.extend((result[0], result[1], refreshed_at, request_id) for request_id in ids)
+            readings.extend((location, refreshed_at, result[0], result[1]) for location in locations)
+            if len(pending) >= self.batch_size:
+                updated += self._write(pending, readings)
+                pending, readings = [], []
+        if pending:
+            updated += self._write(pending, readings)
+        self.db.write(observations.apply_retention)
+        self.stats["runs"] += 1
+        return updated
+
+    def _write(self, rows, readings):
+        def apply(conn):
+            conn.executemany(
+                "UPDATE weather_requests SET temperature = ?, weather_desc = ?, refreshed_at = ? WHERE id = ?", rows
+            )
+            observations.record(conn, readings)
+        self.db.write(apply)
+        self.stats["updated"] += len(rows)
+        return len(rows)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                updated = self.run_once()
+                print(f"Refreshed {updated} active weather requests.")
+            except Exception as e:
+                print(f"Refresh run failed: {e}")
+            self._stop.wait(max(0, self.interval - (time.monotonic() - start)))
+
+    def start(self):
+        """Run in a daemon thread; safe to call more than once."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="weather-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh stored weather for active requests.")
+    parser.add_argument("--interval", type=int, default=900, help="seconds between runs (default: 900)")
+    parser.add_argument("--calls-per-minute", type=int, default=60, help="upstream call budget (default: 60)")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = parser.parse_args()
+
+    import core
+    scheduler = RefreshScheduler(core.db, core.fetch_cached_weather, args.interval, args.calls_per_minute,
+                                 limiter=core.openweather_api.limiter)
+    if args.once:
+        print(f"Refreshed {scheduler.run_once()} active weather requests.")
+    else:
+        scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+"""Async JSON HTTP API over the weather request store.
+
+Usage:
+    python service.py [--host 127.0.0.1] [--port 8080] [--workers 32]
+
+Endpoints (JSON bodies in and out):
+    GET    /requests?search=&sort=newest&limit=100&after=   one page and the "next" cursor
+    GET    /requests.ndjson?search=&sort=newest             every match, streamed as NDJSON
+    GET    /requests/<id>                                  one request with its daily forecast
+    GET    /requests/near?lat=&lng=&radius_km=10&limit=100  requests within radius_km, closest first
+    POST   /requests                                       {"location", "start_date", "end_date"}
+    POST   /requests/batch                                 [{"location", "start_date", "end_date"}, ...]
+    PATCH  /requests/<id>                                  {"temperature"?, "weather_desc"?}
+    DELETE /requests/<id>
+    POST   /requests/update                                {"ids"?, <filters>, "temperature"?, "weather_desc"?}
+    POST   /requests/delete                                {"ids"?, <filters>}
+    GET    /weather?location=                              current weather (cached)
+    POST   /weather/batch                                  {"locations": [...]}
+    GET    /export?format=csv&gzip=0                       csv, json, ndjson or parquet file
+    GET    /stats                                          API client, quota and coalescing counters
+    GET    /metrics                                        Prometheus text format (see metrics.py)
+
+GET responses on the request store carry an ETag built from the
+weather_requests change counter (table_versions); send it back in
+If-None-Match to get 304 Not Modified until the table is written again.
+
+Bulk update and delete select requests by "ids" and/or the filters
+"locations" (list, case-insensitive), "date_from"/"date_to" (start date,
+YYYY-MM-DD) and "temp_min"/"temp_max"; every given condition must match.
+Each runs as one statement and returns the number of rows changed.
+
+The server is plain asyncio streams with HTTP/1.1 keep-alive. Calls into
+core.py block (SQLite, upstream APIs), so they run on a thread pool, at
+BATCH rate-limit priority so Streamlit users keep precedence.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import functools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+import core
+import metrics
+from cache import LRUCache
+from export import export_filename, export_mime, export_query
+from ratelimit import BATCH, priority
+
+MAX_BODY = 16 * 1024 * 1024  # bytes
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 1000  # rows fetched per keyset page when streaming
+MAX_BATCH = 10000  # items per batch call
+RESPONSE_CACHE_SIZE = 4096  # encoded GET bodies kept per (URL, data version)
+MAX_RADIUS_KM = 500  # widest /requests/near search; every stored point in the box is ranked
+
+SORTS = {
+    "newest": "Newest First",
+    "oldest": "Oldest First",
+    "temp_desc": "Temperature (High to Low)",
+    "temp_asc": "Temperature (Low to High)",
+}
+
+FORECAST_FIELDS = ["day", "temp_min", "temp_max", "temp_mean", "weather_desc"]
+
+
+class HttpError(Exception):
+    """Turned into a JSON error response with the given status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query))
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HttpError(400, "body is not valid JSON")
+
+
+class Response:
+    """A response with a bytes body, or a chunked one when stream is an async iterator of bytes."""
+
+    def __init__(self, status=200, body=b"", content_type="application/json", headers=None, stream=None):
+        self.status = status
+        self.body = body
+        self.headers = {"Content-Type": content_type, **(headers or {})}
+        self.stream = stream
+
+
+def json_response(data, status=200, headers=None):
+    return Response(status, json.dumps(data).encode(), headers=headers)
+
+
+def _record(row):
+    return dict(zip(core.REQUEST_FIELDS, row))
+
+
+def _encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode() if cursor else None
+
+
+def _decode_cursor(token):
+    if not token:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token))
+    except (ValueError, binascii.Error):
+        raise HttpError(400, "invalid cursor")
+    # [sort value, id] as built by fetch_weather_requests_page(); anything else would reach SQLite
+    if (not isinstance(cursor, list) or len(cursor) != 2
+            or not isinstance(cursor[0], (str, int, float, type(None))) or isinstance(cursor[0], bool)
+            or not isinstance(cursor[1], int) or isinstance(cursor[1], bool)):
+        raise HttpError(400, "invalid cursor")
+    return tuple(cursor)
+
+
+def _int(value, name, low=None, high=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name} must be an integer")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise HttpError(400, f"{name} must be between {low} and {high}")
+    return value
+
+
+def _float(value, name, low, high):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name} must be a number")
+    if not low <= value <= high:
+        raise HttpError(400, f"{name} must be between {low} and {high}")
+    return value
+
+
+def _bulk_targets(body):
+    """Return core bulk-operation keyword arguments from a body's "ids" and filter fields."""
+    if not isinstance(body, dict):
+        raise HttpError(400, "expected an object")
+    targets = {}
+    if "ids" in body:
+        ids = body["ids"]
+        if not isinstance(ids, list) or len(ids) > MAX_BATCH:
+            raise HttpError(400, f"ids must be a list of at most {MAX_BATCH} ids")
+        targets["record_ids"] = [_int(record_id, "ids") for record_id in ids]
+    if "locations" in body:
+        locations = body["locations"]
+        if not isinstance(locations, list) or not all(isinstance(location, str) for location in locations):
+            raise HttpError(400, "locations must be a list of strings")
+        targets["locations"] = locations
+    for name in ("date_from", "date_to"):
+        if body.get(name) is not None:
+            if not isinstance(body[name], str) or not core.validate_date(body[name]):
+                raise HttpError(400, f"{name} must be a YYYY-MM-DD date")
+            targets[name] = body[name]
+    for name in ("temp_min", "temp_max"):
+        if body.get(name) is not None:
+            if isinstance(body[name], bool) or not isinstance(body[name], (int, float)):
+                raise HttpError(400, f"{name} must be a number")
+            targets[name] = body[name]
+    if not targets:
+        raise HttpError(400, "expected ids and/or locations, date_from, date_to, temp_min or temp_max")
+    return targets
+
+
+def _sort(request):
+    sort = request.query.get("sort", "newest")
+    if sort not in SORTS:
+        raise HttpError(400, f"sort must be one of {', '.join(SORTS)}")
+    return SORTS[sort]
+
+
+def _request_fields(item):
+    """Return (location, start_date, end_date) from a create body, or raise 400."""
+    if not isinstance(item, dict):
+        raise HttpError(400, "expected an object with location, start_date and end_date")
+    location, start_date, end_date = (item.get(key) for key in ("location", "start_date", "end_date"))
+    if not all(isinstance(value, str) and value.strip() for value in (location, start_date, end_date)):
+        raise HttpError(400, "location, start_date and end_date are required strings")
+    if not core.validate_date_range(start_date, end_date):
+        raise HttpError(400, "dates must be YYYY-MM-DD with start_date <= end_date")
+    return location.strip(), start_date, end_date
+
+
+def _at_batch_priority(func, *args):
+    with priority(BATCH):
+        return func(*args)
+
+
+class WeatherService:
+    """Routes HTTP requests to core.py functions; serve() runs it on an asyncio server."""
+
+    def __init__(self, workers=32):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self.responses = LRUCache(max_size=RESPONSE_CACHE_SIZE)
+        self.routes = [
+            ("GET", r"/requests", self.list_requests),
+            ("GET", r"/requests\.ndjson", self.stream_requests),
+            ("GET", r"/requests/near", self.requests_near),
+            ("GET", r"/requests/(\d+)", self.get_request),
+            ("POST", r"/requests", self.create_request),
+            ("POST", r"/requests/batch", self.create_requests),
+            ("PATCH", r"/requests/(\d+)", self.update_request),
+            ("DELETE", r"/requests/(\d+)", self.delete_request),
+            ("POST", r"/requests/update", self.update_requests),
+            ("POST", r"/requests/delete", self.delete_requests),
+            ("GET", r"/weather", self.current_weather),
+            ("POST", r"/weather/batch", self.current_weather_batch),
+            ("GET", r"/export", self.export),
+            ("GET", r"/stats", self.stats),
+            ("GET", r"/metrics", self.prometheus),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in self.routes]
+
+    async def run(self, func, *args):
+        """Run a blocking core call on the worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _at_batch_priority, func, *args)
+
+    async def dispatch(self, request):
+        allowed = []
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match:
+                if method == request.method or (method, request.method) == ("GET", "HEAD"):
+                    with metrics.timed("weather_http_requests", route=handler.__name__):
+                        return await handler(request, *match.groups())
+                allowed.append(method)
+        if allowed:
+            raise HttpError(405, f"use {', '.join(allowed)}")
+        raise HttpError(404, "no such endpoint")
+
+    async def respond(self, request):
+        try:
+            response = await self.dispatch(request)
+        except HttpError as e:
+            response = json_response({"error": e.message}, e.status)
+        except Exception as e:
+            print(f"Error handling {request.method} {request.path}: {e}")
+            response = json_response({"error": "internal error"}, 500)
+        metrics.inc("weather_http_responses_total", status=response.status)
+        return response
+
+    # Conditional GET
+
+    async def etag(self, request):
+        """Return (ETag, True if the client's If-None-Match already matches it).
+
+        The counter is read before the data, so a write in between can only
+        make the ETag older than the body, which costs the client one extra
+        full response rather than serving it stale data.
+        """
+        etag = f'"{await self.run(core.get_data_version)}"'
+        candidates = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+        return etag, etag in candidates or "*" in candidates
+
+    # Request store
+
+    async def cached(self, request, etag, build):
+        """Return build()'s JSON response, reusing the encoded body while the ETag is unchanged."""
+        key = (request.path, tuple(sorted(request.query.items())), etag)
+        body = self.responses.get(key)
+        if body is None:
+            body = json.dumps(await build()).encode()
+            self.responses.set(key, body)
+        return Response(200, body, headers={"ETag": etag})
+
+    async def list_requests(self, request):
+        etag, fresh = await self.etag(request)
+        if fresh:
+            return Response(304, headers={"ETag": etag})
+        return await self.cached(request, etag, lambda: self._list_page(request))
+
+    async def _list_page(self, request):
+        limit = _int(request.query.get("limit", 100), "limit", 1, MAX_PAGE_SIZE)
+        after = _decode_cursor(request.query.get("after"))
+        rows, cursor = await self.run(
+            core.fetch_weather_requests_page, _sort(request), limit, after, request.query.get("search", "")
+        )
+        return {"items": [_record(row) for row in rows], "next": _encode_cursor(cursor)}
+
+    async def stream_requests(self, request):
+        etag, fresh = await self.etag(request)
+        if fresh:
+            return Response(304, headers={"ETag": etag})
+        sort_by, search = _sort(request), request.query.get("search", "")
+
+        async def lines():
+            # One keyset page per worker call, so no cursor is held open across threads
+            cursor = None
+            while True:
+                rows, cursor = await self.run(core.fetch_weather_requests_page, sort_by, STREAM_PAGE_SIZE, cursor, search)
+                if rows:
+                    yield "".join(json.dumps(_record(row)) + "\n" for row in rows).encode()
+                if cursor is None:
+                    break
+
+        return Response(200, content_type="application/x-ndjson", headers={"ETag": etag}, stream=lines())
+
+    async def get_request(self, request, record_id):
+        etag, fresh = await self.etag(request)
+        if fresh:
+            return Response(304, headers={"ETag": etag})
+        return await self.cached(request, etag, lambda: self._record_with_forecast(record_id))
+
+    async def requests_near(self, request):
+        lat = _float(request.query.get("lat"), "lat", -90, 90)
+        lng = _float(request.query.get("lng"), "lng", -180, 180)
+        radius_km = _float(request.query.get("radius_km", 10), "radius_km", 0, MAX_RADIUS_KM)
+        limit = _int(request.query.get("limit", 100), "limit", 1, MAX_PAGE_SIZE)
+        etag, fresh = await self.etag(request)
+        if fresh:
+            return Response(304, headers={"ETag": etag})
+        return await self.cached(request, etag, lambda: self._requests_near(lat, lng, radius_km, limit))
+
+    async def _requests_near(self, lat, lng, radius_km, limit):
+        rows = await self.run(core.requests_near, lat, lng, radius_km, limit)
+        return {"items": [
+            {"distance_km": round(distance, 3), "id": record_id, "location": location, "latitude": p_lat, "longitude": p_lng}
+            for distance, record_id, location, p_lat, p_lng in rows
+        ]}
+
+    async def _record_with_forecast(self, record_id):
+        row = await self.run(core.read_weather_request, record_id)
+        if row is None:
+            raise HttpError(404, f"weather request {record_id} not found")
+        forecast = await self.run(core.read_request_forecast, record_id)
+        return {**_record(row), "forecast": [dict(zip(FORECAST_FIELDS, day)) for day in forecast]}
+
+    async def create_request(self, request):
+        location, start_date, end_date = _request_fields(request.json())
+        request_id = await self.run(core.create_weather_request, location, start_date, end_date)
+        if not request_id:
+            raise HttpError(502, f"could not fetch weather for {location}")
+        row = await self.run(core.read_weather_request, request_id)
+        return json_response(_record(row), 201, headers={"Location": f"/requests/{request_id}"})
+
+    async def create_requests(self, request):
+        items = request.json()
+        if not isinstance(items, list) or len(items) > MAX_BATCH:
+            raise HttpError(400, f"expected a list of at most {MAX_BATCH} requests")
+        # create_weather_requests() takes one date range, so group by range
+        groups, rejected = {}, []
+        for index, item in enumerate(items):
+            try:
+                location, start_date, end_date = _request_fields(item)
+            except HttpError as e:
+                rejected.append({"index": index, "error": e.message})
+                continue
+            groups.setdefault((start_date, end_date), []).append(location)
+        saved, failed = [], []
+        for (start_date, end_date), locations in groups.items():
+            group_saved, group_failed = await self.run(core.create_weather_requests, locations, start_date, end_date)
+            saved.extend(group_saved)
+            failed.extend(group_failed)
+        return json_response({"saved": saved, "failed": failed, "rejected": rejected})
+
+    async def update_request(self, request, record_id):
+        body = request.json()
+        if not isinstance(body, dict) or not {"temperature", "weather_desc"} & body.keys():
+            raise HttpError(400, "expected temperature and/or weather_desc")
+        temperature, description = body.get("temperature"), body.get("weather_desc")
+        if temperature is not None and (isinstance(temperature, bool) or not isinstance(temperature, (int, float))):
+            raise HttpError(400, "temperature must be a number")
+        if description is not None and not isinstance(description, str):
+            raise HttpError(400, "weather_desc must be a string")
+        if not await self.run(core.update_weather_request, record_id, temperature, description):
+            raise HttpError(404, f"weather request {record_id} not found")
+        return json_response(_record(await self.run(core.read_weather_request, record_id)))
+
+    async def delete_request(self, request, record_id):
+        if not await self.run(core.delete_weather_request, record_id):
+            raise HttpError(404, f"weather request {record_id} not found")
+        return json_response({"deleted": 1})
+
+    async def update_requests(self, request):
+        body = request.json()
+        targets = _bulk_targets(body)
+        temperature, description = body.get("temperature"), body.get("weather_desc")
+        if temperature is None and description is None:
+            raise HttpError(400, "expected temperature and/or weather_desc")
+        if temperature is not None and (isinstance(temperature, bool) or not isinstance(temperature, (int, float))):
+            raise HttpError(400, "temperature must be a number")
+        if description is not None and not isinstance(description, str):
+            raise HttpError(400, "weather_desc must be a string")
+        update = functools.partial(core.update_weather_requests, new_temp=temperature, new_desc=description, **targets)
+        return json_response({"updated": await self.run(update)})
+
+    async def delete_requests(self, request):
+        targets = _bulk_targets(request.json())
+        return json_response({"deleted": await self.run(functools.partial(core.delete_weather_requests, **targets))})
+
+    # Weather and export
+
+    async def current_weather(self, request):
+        location = request.query.get("location", "").strip()
+        if not location:
+            raise HttpError(400, "location is required")
+        temp, desc, lat, lng = await self.run(core.get_current_weather, location)
+        if temp is None:
+            raise HttpError(502, f"weather unavailable for {location}")
+        return json_response({"location": location, "temperature": temp, "weather_desc": desc,
+                              "latitude": lat, "longitude": lng})
+
+    async def current_weather_batch(self, request):
+        body = request.json()
+        locations = body.get("locations") if isinstance(body, dict) else None
+        if not isinstance(locations, list) or len(locations) > MAX_BATCH or \
+                not all(isinstance(location, str) for location in locations):
+            raise HttpError(400, f"expected {{\"locations\": [...]}} with at most {MAX_BATCH} strings")
+        results = await self.run(core.get_current_weather_batch, locations)
+        return json_response({
+            location: None if temp is None else
+            {"temperature": temp, "weather_desc": desc, "latitude": lat, "longitude": lng}
+            for location, (temp, desc, lat, lng) in results.items()
+        })
+
+    async def export(self, request):
+        fmt = request.query.get("format", "csv").lower()
+        if fmt not in ("csv", "json", "ndjson", "parquet"):
+            raise HttpError(400, "format must be csv, json, ndjson or parquet")
+        compress = request.query.get("gzip", "0") in ("1", "true") and fmt != "parquet"
+        etag, fresh = await self.etag(request)
+        if fresh:
+            return Response(304, headers={"ETag": etag})
+        headers = {
+            "ETag": etag,
+            "Content-Disposition": f'attachment; filename="{export_filename("weather_data_export", fmt, compress)}"',
+        }
+        if request.method == "HEAD":
+            # Same headers as GET, without building a file nobody will read
+            return Response(200, content_type=export_mime(fmt, compress), stream=_no_chunks(), headers=headers)
+
+        def build():
+            return core.db.run(export_query, f"SELECT {core.REQUEST_COLUMNS} FROM weather_requests ORDER BY id",
+                               (), core.EXPORT_COLUMNS, fmt, compress, op="export")
+
+        try:
+            export_file, _ = await self.run(build)
+        except RuntimeError as e:  # e.g. pyarrow missing for Parquet
+            raise HttpError(501, str(e))
+
+        async def chunks():
+            with export_file:
+                while True:
+                    chunk = await self.run(export_file.read, 1 << 16)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return Response(200, content_type=export_mime(fmt, compress), stream=chunks(), headers=headers)
+
+    async def stats(self, request):
+        return json_response({
+            "api": await self.run(core.get_api_stats),
+            "quota": await self.run(core.get_quota_usage),
+            "coalescing": await self.run(core.get_coalescing_stats),
+        })
+
+    async def prometheus(self, request):
+        return Response(200, metrics.render().encode(), content_type=metrics.CONTENT_TYPE)
+
+    # HTTP/1.1 plumbing
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HttpError as e:
+                    await _write_response(writer, json_response({"error": e.message}, e.status), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                response = await self.respond(request)
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                await _write_response(writer, response, keep_alive, head_only=request.method == "HEAD")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error on connection: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=1 << 16)
+        print(f"Weather API on http://{host}:{server.sockets[0].getsockname()[1]}")
+        async with server:
+            await server.serve_forever()
+
+
+async def _read_request(reader):
+    """Read one request; None on a cleanly closed connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    if not version.startswith("HTTP/1."):
+        raise HttpError(505, "only HTTP/1.x is supported")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+        headers["connection"] = "close"
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "send a Content-Length instead of a chunked body")
+    length = _int(headers.get("content-length", 0), "Content-Length", 0)
+    if length > MAX_BODY:
+        raise HttpError(413, f"bodies are limited to {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+async def _no_chunks():
+    """Empty body stream for HEAD responses whose GET is chunked."""
+    return
+    yield
+
+
+async def _write_response(writer, response, keep_alive=True, head_only=False):
+    headers = dict(response.headers)
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    if response.status == 304:
+        headers.pop("Content-Type")
+    if response.stream is None:
+        headers["Content-Length"] = str(len(response.body))
+    else:
+        headers["Transfer-Encoding"] = "chunked"
+    head = f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}\r\n" + \
+        "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+    writer.write(head.encode("latin-1"))
+    if head_only or response.status == 304:
+        if response.stream is not None:
+            await response.stream.aclose()  # runs the generator's cleanup if it had started
+    elif response.stream is None:
+        writer.write(response.body)
+    else:
+        async for chunk in response.stream:
+            writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the weather request store as a JSON HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=32, help="threads for database and API calls")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(WeatherService(args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
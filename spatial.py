@@ -0,0 +1,200 @@
+"""Spatial lookups over stored request coordinates.
+
+Bounding-box and radius queries use the `request_points` R*Tree (see
+migration 9 in migrations.py), which triggers keep in step with
+weather_requests. Nearest-location queries use an in-memory k-d tree over
+the distinct stored locations (LocationIndex), which also gives offline
+reverse geocoding: the closest saved place name for a pair of coordinates.
+core.py serves radius queries as requests_near() (GET /requests/near in
+service.py) and uses reverse geocoding to label typed coordinates.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371.0088
+
+# "51.5,-0.12", "51.5 -0.12", "51.5°N, 0.12°W". Not ";": the app splits
+# location input on it (core.split_locations) before it gets here.
+_COORDINATES = re.compile(
+    r"^\s*([+-]?\d{1,3}(?:\.\d+)?)\s*°?\s*([NS])?\s*[,\s]\s*([+-]?\d{1,3}(?:\.\d+)?)\s*°?\s*([EW])?\s*$",
+    re.IGNORECASE
+)
+
+
+def parse_coordinates(text):
+    """Return (lat, lng) if text is a coordinate pair, else None."""
+    text = str(text)
+    match = _COORDINATES.match(text)
+    if match is None:
+        return None
+    lat, ns, lng, ew = match.groups()
+    if not (ns or ew or "," in text or ("." in lat and "." in lng)):
+        # Bare "75 001" is more likely a postcode than a coordinate pair
+        return None
+    lat, lng = float(lat), float(lng)
+    if ns and ns.upper() == "S":
+        lat = -abs(lat)
+    if ew and ew.upper() == "W":
+        lng = -abs(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def box_around(lat, lng, radius_km):
+    """Return (south, west, north, east) enclosing a circle; west > east when it wraps the antimeridian."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if south == -90.0 or north == 90.0:
+        return south, -180.0, north, 180.0
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(lat))))
+    if dlng >= 180:
+        return south, -180.0, north, 180.0
+    west, east = lng - dlng, lng + dlng
+    return south, west + 360 if west < -180 else west, north, east - 360 if east > 180 else east
+
+
+def within_box(conn, south, west, north, east, limit=1000):
+    """Return [(id, location, lat, lng), ...] for requests inside the box.
+
+    west > east selects a box that crosses the antimeridian; limit=None
+    returns every match.
+    """
+    ranges = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    rows = []
+    for low, high in ranges:
+        # The R*Tree stores 32-bit floats, so re-check against the exact coordinates
+        rows += conn.execute('''
+            SELECT weather_requests.id, location, latitude, longitude
+            FROM request_points JOIN weather_requests ON weather_requests.id = request_points.id
+            WHERE max_lat >= ? AND min_lat <= ? AND max_lng >= ? AND min_lng <= ?
+              AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+            LIMIT ?
+        ''', (south, north, low, high, south, north, low, high, -1 if limit is None else limit - len(rows))).fetchall()
+    return rows
+
+
+def within_radius(conn, lat, lng, radius_km, limit=1000):
+    """Return [(distance km, id, location, lat, lng), ...] for requests within radius_km, closest first."""
+    # Every point in the box is a candidate: a capped box scan could drop closer points
+    candidates = within_box(conn, *box_around(lat, lng, radius_km), limit=None)
+    found = [(haversine_km(lat, lng, p_lat, p_lng), request_id, location, p_lat, p_lng)
+             for request_id, location, p_lat, p_lng in candidates]
+    return heapq.nsmallest(limit, (row for row in found if row[0] <= radius_km))
+
+
+def _unit_vector(lat, lng):
+    phi, lam = math.radians(lat), math.radians(lng)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+class KDTree:
+    """Static k-d tree over (payload, lat, lng) points for nearest-neighbour search.
+
+    Points are mapped to 3-D unit vectors, where straight-line (chord)
+    distance grows with great-circle distance, so the tree prunes with
+    Euclidean bounds and still ranks by true distance, poles and the
+    antimeridian included.
+    """
+
+    def __init__(self, points):
+        self.points = [(payload, lat, lng, _unit_vector(lat, lng)) for payload, lat, lng in points]
+        self.root = self._build(list(range(len(self.points))), 0)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][3][axis])
+        middle = len(indices) // 2
+        return (indices[middle], axis,
+                self._build(indices[:middle], depth + 1), self._build(indices[middle + 1:], depth + 1))
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest(self, lat, lng, k=1):
+        """Return up to k [(distance km, payload, lat, lng), ...], closest first."""
+        target = _unit_vector(lat, lng)
+        heap = []  # (-squared chord, index) of the best k so far
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            vector = self.points[index][3]
+            distance = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if len(heap) < k:
+                heapq.heappush(heap, (-distance, index))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, index))
+            diff = target[axis] - vector[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        if k > 0:
+            visit(self.root)
+        result = []
+        for negative, index in sorted(heap, reverse=True):
+            payload, p_lat, p_lng, _ = self.points[index]
+            chord = math.sqrt(-negative)
+            result.append((2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2)), payload, p_lat, p_lng))
+        return result
+
+
+def location_points(conn):
+    """Return [(location, lat, lng), ...], one averaged point per distinct stored location."""
+    return conn.execute('''
+        SELECT MIN(location), AVG(latitude), AVG(longitude) FROM weather_requests
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        GROUP BY location_key
+    ''').fetchall()
+
+
+class LocationIndex:
+    """KD-tree of the distinct stored locations of a Database.
+
+    The tree is rebuilt when weather_requests has changed, but at most once
+    every max_age seconds, so a stream of writes does not trigger a rebuild
+    per query.
+    """
+
+    def __init__(self, db, max_age=60):
+        self.db = db
+        self.max_age = max_age
+        self._tree = None
+        self._version = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def tree(self):
+        version = self.db.read_one("SELECT version FROM table_versions WHERE name = 'weather_requests'")[0]
+        with self._lock:
+            if self._tree is None or (version != self._version and time.time() - self._built_at >= self.max_age):
+                self._tree = KDTree(self.db.run(location_points))
+                self._version = version
+                self._built_at = time.time()
+            return self._tree
+
+    def nearest(self, lat, lng, k=5, max_km=None):
+        """Return up to k [(distance km, location, lat, lng), ...] closest to (lat, lng)."""
+        found = self.tree().nearest(lat, lng, k)
+        return [row for row in found if max_km is None or row[0] <= max_km]
+
+    def reverse_geocode(self, lat, lng, max_km=25):
+        """Return the name of the closest stored location within max_km, or None."""
+        found = self.nearest(lat, lng, 1, max_km)
+        return found[0][1] if found else None
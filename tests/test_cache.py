@@ -0,0 +1,60 @@
+"""GeocodeCache and VideoCache: the two tiers of PersistentCache over migrated tables."""
+import time
+
+import pytest
+
+import cache
+from cache import GeocodeCache, VideoCache
+from db import Database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Fresh process-wide LRU tiers, so each test starts from the table alone
+    monkeypatch.setattr(cache, "_shared_tiers", {})
+    db = Database(str(tmp_path / "weather_app.db"))
+    yield db
+    db.close()
+
+
+def wait_for_row(db, table):
+    # Table writes are queued on the writer thread and not waited for
+    for _ in range(50):
+        if db.read_one(f"SELECT 1 FROM {table}"):
+            return
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("cache_class, value", [
+    (GeocodeCache, (48.8566, 2.3522)),
+    (VideoCache, [{"title": "Paris in the rain", "video_id": "abc123"}]),
+])
+def test_fetch_once_then_serve_from_memory_and_table(db, monkeypatch, cache_class, value):
+    calls = []
+    first = cache_class(db)
+    assert first.get_or_fetch("  Paris ", lambda location: calls.append(location) or value) == value
+    assert first.get_or_fetch("paris", lambda location: calls.append(location) or value) == value
+    assert calls == ["  Paris "]
+    assert first.stats["memory_hits"] == 1
+
+    wait_for_row(db, cache_class.table)
+    monkeypatch.setattr(cache, "_shared_tiers", {})  # as if in a new process
+    second = cache_class(db)
+    assert second.get("PARIS") == value
+    assert second.stats["db_hits"] == 1
+
+
+def test_failures_are_not_cached(db):
+    videos = VideoCache(db)
+    assert videos.get_or_fetch("Paris", lambda location: None) is None
+    assert videos.get_or_fetch("Paris", lambda location: []) == []
+
+
+def test_expired_rows_are_misses_and_pruned(db):
+    geocode = GeocodeCache(db, ttl=-1)
+    geocode.set("Paris", (48.8566, 2.3522))
+    wait_for_row(db, "geocode_cache")
+    geocode.memory.clear()
+    assert geocode.get("Paris") is None
+    geocode.prune()
+    assert geocode.is_empty()
@@ -0,0 +1,102 @@
+"""Forecast parsing and caching, checked against a recorded OpenWeather /forecast response.
+
+The fixture is a 5-day/3-hour forecast for New York (UTC-4) starting at
+2024-06-15 00:00 UTC, so its first two entries fall on 2024-06-14 local time.
+"""
+import json
+import os
+
+import pytest
+
+import cache
+import core
+from cache import ForecastCache
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "openweather_forecast.json")
+LAT, LNG = 40.7128, -74.006
+NOW = 1718409600  # 2024-06-15 00:00 UTC, the start of an issue period
+
+
+class RecordedApi:
+    """Stands in for core.openweather_api: replays the fixture and records each request."""
+
+    def __init__(self):
+        with open(FIXTURE) as f:
+            self.response = json.load(f)
+        self.calls = []
+
+    def get_json(self, path, params):
+        self.calls.append((path, params))
+        return self.response
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = RecordedApi()
+    monkeypatch.setattr(core, "openweather_api", api)
+    monkeypatch.setattr(core, "forecast_cache", ForecastCache(
+        grid=core.FORECAST_CACHE_GRID, issue_interval=core.FORECAST_ISSUE_INTERVAL, max_size=core.FORECAST_CACHE_SIZE
+    ))
+    monkeypatch.setattr(cache.time, "time", lambda: NOW)
+    return api
+
+
+def test_entries_grouped_by_local_date(api):
+    days = core.fetch_forecast(LAT, LNG)
+
+    # Grouping in UTC would give 2024-06-15..19; the -4h offset adds the 14th
+    assert sorted(days) == ["2024-06-14", "2024-06-15", "2024-06-16", "2024-06-17", "2024-06-18", "2024-06-19"]
+    low, high, mean, desc = days["2024-06-14"]
+    assert (low, high, desc) == (19.8, 21.3, "overcast clouds")
+    assert mean == pytest.approx(20.55)
+    # 2024-06-15 local runs from 04:00 UTC that day to 04:00 UTC the next
+    low, high, mean, desc = days["2024-06-15"]
+    assert (low, high, desc) == (17.9, 27.2, "clear sky")
+    assert mean == pytest.approx(175.0 / 8)
+    assert api.calls == [("forecast", {"lat": LAT, "lon": LNG, "appid": core.OPENWEATHER_API_KEY, "units": "metric"})]
+
+
+def test_error_response_gives_none(api):
+    api.response = {"cod": "401", "message": "Invalid API key."}
+    assert core.fetch_forecast(LAT, LNG) is None
+
+
+def test_range_filtered_to_window(api):
+    days = core.get_forecast_range(LAT, LNG, "2024-06-16", "2024-06-17")
+    assert [day[0] for day in days] == ["2024-06-16", "2024-06-17"]
+    assert days[0][1:] == core.fetch_forecast(LAT, LNG)["2024-06-16"]
+
+    # Days past the forecast horizon are left out
+    assert [day[0] for day in core.get_forecast_range(LAT, LNG, "2024-06-18", "2024-07-01")] == ["2024-06-18", "2024-06-19"]
+    assert core.get_forecast_range(LAT, LNG, "2024-06-01", "2024-06-10") == []
+
+
+def test_cell_and_issue_period_share_one_request(api):
+    core.get_forecast_range(LAT, LNG, "2024-06-15", "2024-06-16")
+    core.get_forecast_range(LAT, LNG, "2024-06-17", "2024-06-19")
+    core.get_forecast_range(40.72, -74.01, "2024-06-15", "2024-06-19")  # same 0.1° cell
+    assert len(api.calls) == 1
+
+    core.get_forecast_range(41.0, -74.006, "2024-06-15", "2024-06-19")  # another cell
+    assert len(api.calls) == 2
+
+
+def test_next_issue_period_fetches_again(api, monkeypatch):
+    core.get_forecast_range(LAT, LNG, "2024-06-15", "2024-06-16")
+    monkeypatch.setattr(cache.time, "time", lambda: NOW + core.FORECAST_ISSUE_INTERVAL - 1)
+    core.get_forecast_range(LAT, LNG, "2024-06-15", "2024-06-16")
+    assert len(api.calls) == 1
+
+    monkeypatch.setattr(cache.time, "time", lambda: NOW + core.FORECAST_ISSUE_INTERVAL)
+    core.get_forecast_range(LAT, LNG, "2024-06-15", "2024-06-16")
+    assert len(api.calls) == 2
+
+
+def test_failures_not_cached(api):
+    good = api.response
+    api.response = {"cod": "500", "message": "Internal error"}
+    assert core.get_forecast_range(LAT, LNG, "2024-06-15", "2024-06-16") is None
+
+    api.response = good
+    assert len(core.get_forecast_range(LAT, LNG, "2024-06-15", "2024-06-16")) == 2
+    assert len(api.calls) == 2
@@ -0,0 +1,37 @@
+"""Schema migrations, including several processes opening a new database at once."""
+import sqlite3
+import threading
+
+import migrations
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    conn = migrations.connect(str(tmp_path / "weather_app.db"))
+    assert migrations.get_version(conn) == migrations.LATEST_VERSION
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION  # nothing left to apply
+
+
+def test_concurrent_connects_apply_each_step_once(tmp_path):
+    # Like the Streamlit app and `cli.py serve` starting together on a new file
+    path = str(tmp_path / "weather_app.db")
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def connect():
+        barrier.wait()
+        try:
+            migrations.connect(path).close()
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=connect) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    conn = sqlite3.connect(path)
+    assert migrations.get_version(conn) == migrations.LATEST_VERSION
+    columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(weather_requests)")]
+    assert columns.count("location_key") == 1
@@ -0,0 +1,68 @@
+"""View Requests queries: keyset pagination over NULL temperatures, and location search."""
+import pytest
+
+import core
+from db import Database
+
+TEMPERATURES = [12.5, None, 3.0, 12.5, None, -4.0, 20.0, None]
+
+
+@pytest.fixture
+def requests_db(monkeypatch, tmp_path):
+    db = Database(str(tmp_path / "weather_app.db"))
+    db.write(lambda conn: conn.executemany(core.INSERT_REQUEST_SQL, [
+        (f"Place {i}", 0.0, 0.0, "2024-06-01", "2024-06-01", temp, "clear sky", f"2024-06-01T00:00:{i:02d}")
+        for i, temp in enumerate(TEMPERATURES)
+    ]))
+    monkeypatch.setattr(core, "db", db)
+    yield db
+    db.close()
+
+
+def all_pages(sort_by, page_size):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = core.fetch_weather_requests_page(sort_by, page_size, cursor)
+        ids += [row[0] for row in rows]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort_by", list(core.SORT_ORDERS))
+@pytest.mark.parametrize("page_size", [1, 2, 3, 100])
+def test_pages_cover_every_row_in_sql_order(requests_db, sort_by, page_size):
+    column, direction = core.SORT_ORDERS[sort_by]
+    expected = [row[0] for row in requests_db.read(
+        f"SELECT id FROM weather_requests ORDER BY {column} {direction}, id {direction}"
+    )]
+    assert all_pages(sort_by, page_size) == expected
+
+
+def test_nulls_come_first_low_to_high_and_last_high_to_low(requests_db):
+    low_to_high = all_pages("Temperature (Low to High)", 1)
+    high_to_low = all_pages("Temperature (High to Low)", 1)
+    nulls = [i + 1 for i, temp in enumerate(TEMPERATURES) if temp is None]
+    assert low_to_high[:3] == nulls
+    assert high_to_low[-3:] == nulls[::-1]
+
+
+@pytest.mark.parametrize("search, expected", [
+    ("ny", ["Sunnyvale", "Nyon", "Albany"]),
+    ("N", ["Sunnyvale", "Nyon", "Albany", "New York", "Pune", "100% Town"]),
+    ("%", ["100% Town"]),
+    ("_", []),
+    ("new", ["New York"]),
+])
+def test_search_matches_substrings_of_any_length(monkeypatch, tmp_path, search, expected):
+    db = Database(str(tmp_path / "weather_app.db"))
+    names = ["Sunnyvale", "Nyon", "Albany", "New York", "Pune", "100% Town"]
+    db.write(lambda conn: conn.executemany(core.INSERT_REQUEST_SQL, [
+        (name, 0.0, 0.0, "2024-06-01", "2024-06-01", 20.0, "clear sky", "2024-06-01T00:00:00") for name in names
+    ]))
+    monkeypatch.setattr(core, "db", db)
+    try:
+        rows, _ = core.fetch_weather_requests_page("Oldest First", 100, None, search)
+        assert [row[1] for row in rows] == expected
+        assert core.count_weather_requests(search) == len(expected)
+    finally:
+        db.close()
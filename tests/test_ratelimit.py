@@ -0,0 +1,66 @@
+"""Daily budgets shared through api_quota, and 429 penalties without a token bucket."""
+import threading
+import time
+
+import pytest
+
+from db import Database
+from ratelimit import BACKGROUND, RateLimiter, RateLimitExceeded
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "weather_app.db"))
+    yield db
+    db.close()
+
+
+def spend(limiter, calls, level=None):
+    granted = 0
+    for _ in range(calls):
+        try:
+            limiter.acquire(level=level)
+            granted += 1
+        except RateLimitExceeded:
+            pass
+    return granted
+
+
+def test_limiters_sharing_a_database_share_the_budget(db):
+    # One limiter per process (app, service.py, scheduler.py) for the same API key
+    limiters = [RateLimiter("openweather", per_day=10, db=db) for _ in range(3)]
+    granted = []
+    threads = [threading.Thread(target=lambda limiter=limiter: granted.append(spend(limiter, 10)))
+               for limiter in limiters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(granted) == 10
+    assert db.read_one("SELECT used FROM api_quota WHERE provider = 'openweather'")[0] == 10
+    assert all(limiter.exhausted() for limiter in limiters)
+
+
+def test_usage_charged_elsewhere_counts_against_this_limiter(db):
+    limiter = RateLimiter("youtube", per_day=100, reserve=0.2, db=db)
+    other = RateLimiter("youtube", per_day=100, reserve=0.2, db=db)
+    other.acquire(cost=75)
+
+    assert not limiter.exhausted(BACKGROUND, cost=5)
+    assert limiter.exhausted(BACKGROUND, cost=6)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(cost=6, level=BACKGROUND)
+    limiter.acquire(cost=25)  # interactive calls may use the reserve
+    assert limiter.usage()["used"] == 100
+
+
+def test_penalize_without_bucket_holds_callers_back():
+    limiter = RateLimiter("geocoding")
+    limiter.penalize(0.2)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+    limiter.penalize(5)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(timeout=0.1)